@@ -1,26 +1,15 @@
 import heapq
+import random
+import weakref
+from array import array
+from python_graph import Graph
 
 
-class Node:
-    def __init__(self, idx, weight):
-        self.idx = idx
-        self.weight = weight
-
-    def __gt__(self, other):
-        return self.weight > other
-
-    def __lt__(self, other):
-        return self.weight < other
-
-    def __repr__(self):
-        return f"{self.idx}"
-
-
-def dfs_connected(graph_data: list[list[int]]):
+def dfs_connected(graph: Graph, root: int):
     stack = [root]
-    discovered = [False] * len(graph.data)
-    previous = [-1] * len(graph.data)
-    distance = [-1] * len(graph.data)
+    discovered = [False] * graph.num_nodes
+    previous = [-1] * graph.num_nodes
+    distance = [-1] * graph.num_nodes
 
     discovered[root] = True
     distance[root] = 0
@@ -30,8 +19,8 @@ def dfs_connected(graph_data: list[list[int]]):
         current = stack.pop()
         history.append(current)
 
-        for neighbour, dist in enumerate(graph.data[current]):
-            if dist > 0 and not discovered[neighbour]:
+        for neighbour, dist in graph.out_edges(current):
+            if not discovered[neighbour]:
                 stack.append(neighbour)
                 discovered[neighbour] = True
                 previous[neighbour] = current
@@ -41,11 +30,11 @@ def dfs_connected(graph_data: list[list[int]]):
 
 
 # Gives the shortest path only on unweighted graph
-def bfs(graph_data: list[list[int]], source: int, destination: int):
+def bfs(graph: Graph, source: int, destination: int):
     queue = []
-    discovered = [False] * len(graph_data)
-    distance = [-1] * len(graph_data)  # Mark unreachable nodes as -1
-    previous = [-1] * len(graph_data)
+    discovered = [False] * graph.num_nodes
+    distance = [-1] * graph.num_nodes  # Mark unreachable nodes as -1
+    previous = [-1] * graph.num_nodes
 
     discovered[source] = True
     queue.append(source)
@@ -56,8 +45,8 @@ def bfs(graph_data: list[list[int]], source: int, destination: int):
         current = queue[idx]
         idx += 1
 
-        for neighbour, dist in enumerate(graph_data[current]):
-            if dist > 0 and not discovered[neighbour]:
+        for neighbour, dist in graph.out_edges(current):
+            if not discovered[neighbour]:
                 queue.append(neighbour)
                 discovered[neighbour] = True
                 # distance[neighbour] = distance[current] + dist
@@ -78,10 +67,15 @@ def bfs(graph_data: list[list[int]], source: int, destination: int):
     return best_route, distance[destination], distance
 
 
-def dijkstra(graph_data, source, destination):
-    n = len(graph_data)
-    distance = [float('inf')] * n
-    previous = [-1] * n
+def dijkstra(graph: Graph, source: int, destination: int):
+    """ Shortest path from source to destination over the CSR adjacency of the graph.
+        The search stops as soon as destination is settled. Return the path and its cost,
+        the path is [destination] with inf cost if destination is unreachable.
+        The relaxation loop reads the CSR arrays directly, as in the other searches of this module,
+        a shared relaxation helper over the Graph edge iterators made the queries 10-15% slower. """
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    distance = [float('inf')] * graph.num_nodes
+    previous = [-1] * graph.num_nodes
 
     distance[source] = 0
     heap = [(0, source)]
@@ -91,14 +85,20 @@ def dijkstra(graph_data, source, destination):
 
         if dist > distance[current]:
             continue
-
-        for neighbour, weight in enumerate(graph_data[current]):
-            if weight > 0:
-                new_dist = dist + weight
-                if new_dist < distance[neighbour]:
-                    distance[neighbour] = new_dist
-                    previous[neighbour] = current
-                    heapq.heappush(heap, (new_dist, neighbour))
+        if current == destination:
+            break
+
+        for slot in range(offsets[current], offsets[current + 1]):
+            weight = weights[slot]
+            # removed edges keep their slot with zero weight, the other searches skip them the same way
+            if weight <= 0:
+                continue
+            neighbour = targets[slot]
+            new_dist = dist + weight
+            if new_dist < distance[neighbour]:
+                distance[neighbour] = new_dist
+                previous[neighbour] = current
+                heapq.heappush(heap, (new_dist, neighbour))
 
     # reconstruct path
     path = []
@@ -111,6 +111,111 @@ def dijkstra(graph_data, source, destination):
     return path, distance[destination]
 
 
+def bidirectional_dijkstra(graph: Graph, source: int, destination: int):
+    """ Shortest path from source to destination, searched forward from source over outgoing edges and backward
+        from destination over incoming edges at the same time. The searches stop when the sum of their
+        frontiers can not improve the best meeting point. Return the same as dijkstra. """
+    n = graph.num_nodes
+    inf = float('inf')
+    # index 0 is the forward search, 1 is the backward search
+    distances = ([inf] * n, [inf] * n)
+    parents = ([-1] * n, [-1] * n)
+    heaps = ([(0, source)], [(0, destination)])
+    distances[0][source] = 0
+    distances[1][destination] = 0
+    best_dist, meeting_node = (0, source) if source == destination else (inf, -1)
+    weights = graph.weights
+    # offsets, neighbours and edge slots of both directions, incoming edges of an undirected graph are its outgoing
+    if graph.is_directed:
+        adjacency = ((graph.offsets, graph.targets, range(len(weights))),
+                     (graph.in_offsets, graph.in_sources, graph.in_slots))
+    else:
+        adjacency = ((graph.offsets, graph.targets, range(len(weights))),) * 2
+
+    while heaps[0] and heaps[1] and heaps[0][0][0] + heaps[1][0][0] < best_dist:
+        # expand the search with the closer frontier
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        distance, other_distance, parent = distances[side], distances[1 - side], parents[side]
+        side_offsets, side_neighbours, side_slots = adjacency[side]
+        dist, current = heapq.heappop(heaps[side])
+
+        if dist > distance[current]:
+            continue
+
+        for position in range(side_offsets[current], side_offsets[current + 1]):
+            weight = weights[side_slots[position]]
+            if weight <= 0:
+                continue
+            neighbour = side_neighbours[position]
+            new_dist = dist + weight
+            if new_dist < distance[neighbour]:
+                distance[neighbour] = new_dist
+                parent[neighbour] = current
+                heapq.heappush(heaps[side], (new_dist, neighbour))
+            if new_dist + other_distance[neighbour] < best_dist:
+                best_dist = new_dist + other_distance[neighbour]
+                meeting_node = neighbour
+
+    if meeting_node == -1:
+        return [destination], inf
+
+    # previous nodes lead from the meeting node back to source, next hops lead on to destination
+    path = []
+    current = meeting_node
+    while current != -1:
+        path.append(current)
+        current = parents[0][current]
+    path.reverse()
+    current = parents[1][meeting_node]
+    while current != -1:
+        path.append(current)
+        current = parents[1][current]
+    return path, best_dist
+
+
+def reverse_dijkstra(graph: Graph, destination: int):
+    """ Shortest paths from every node to the destination, found by Dijkstra over incoming edges.
+        Return next hop of every node on its path (-1 for unreachable nodes and destination) and distances. """
+    in_offsets, in_sources, in_slots, weights = graph.in_offsets, graph.in_sources, graph.in_slots, graph.weights
+    distance = [float('inf')] * graph.num_nodes
+    next_hop = [-1] * graph.num_nodes
+
+    distance[destination] = 0
+    heap = [(0, destination)]
+
+    while heap:
+        dist, current = heapq.heappop(heap)
+
+        if dist > distance[current]:
+            continue
+
+        for position in range(in_offsets[current], in_offsets[current + 1]):
+            weight = weights[in_slots[position]]
+            if weight <= 0:
+                continue
+            neighbour = in_sources[position]
+            new_dist = dist + weight
+            if new_dist < distance[neighbour]:
+                distance[neighbour] = new_dist
+                next_hop[neighbour] = current
+                heapq.heappush(heap, (new_dist, neighbour))
+
+    return next_hop, distance
+
+
+def follow_next_hops(next_hop, source: int, destination: int) -> list[int]:
+    """ Rebuild path from source to destination from next hops. Return empty path if destination is unreachable
+        or the next hops loop. """
+    path = [source]
+    current = source
+    while current != destination:
+        current = next_hop[current]
+        if current == -1 or len(path) > len(next_hop):
+            return []
+        path.append(current)
+    return path
+
+
 # def dijkstra(graph_data: list[list[int]], source: int, destination: int):
 #     heap = []
 #     discovered = [False] * len(graph_data)
@@ -150,44 +255,148 @@ def dijkstra(graph_data, source, destination):
 #     return best_route, distance[destination]
 
 
-def a_star(graph_data: list[list[int]], source: int, destination: int):
-    heap = []
-    discovered = [False] * len(graph_data)
-    distance = [float('inf')] * len(graph_data)
-    previous = [-1] * len(graph_data)
+def shortest_distances(graph: Graph, root: int, reverse=False) -> list[float]:
+    """ Distances of the full single-source search from root, or to root over incoming edges if reverse is set.
+        Unreachable nodes are inf. """
+    distance = [float('inf')] * graph.num_nodes
+    distance[root] = 0
+    heap = [(0, root)]
+    edges = graph.in_edges if reverse else graph.out_edges
 
-    # Heuristic which represent distance to destination
-    _, _, hops_from_source = bfs(graph_data, source, destination)
-    hops_to_destination = [hops_from_source[destination] - hops if hops != -1 else -1 for hops in hops_from_source]
+    while heap:
+        dist, current = heapq.heappop(heap)
+
+        if dist > distance[current]:
+            continue
+
+        for neighbour, weight in edges(current):
+            new_dist = dist + weight
+            if new_dist < distance[neighbour]:
+                distance[neighbour] = new_dist
+                heapq.heappush(heap, (new_dist, neighbour))
+
+    return distance
+
+
+class LandmarkTable():
+    """ Distances from and to a few landmark nodes, the lower bounds of ALT heuristic.
+
+        By triangle inequality d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L) for every landmark L,
+        so the largest of these bounds is an admissible and consistent heuristic for weighted edges.
+        Distances of landmark i occupy slots i * num_nodes:(i + 1) * num_nodes of the float64 arrays.
+        Landmarks are picked one by one as the node farthest from the landmarks picked before,
+        which puts them at the periphery of the graph, behind most of the queries. Nodes which no picked landmark
+        reaches (e.g. in a directed graph) are picked first. """
+
+    def __init__(self, graph: Graph, landmarks_num=8, rng=random):
+        self.version = graph.version
+        self.num_nodes = graph.num_nodes
+        self.landmarks: list[int] = []
+        self.from_landmarks = array('d')
+        self.to_landmarks = array('d')
+
+        inf = float('inf')
+        num_nodes = graph.num_nodes
+        has_out_edges = [any(True for _ in graph.out_edges(node)) for node in range(num_nodes)]
+        # search from a node without out edges reaches nothing, so it can not tell the farthest node
+        starts = [node for node in range(num_nodes) if has_out_edges[node]] or list(range(num_nodes))
+        # distance to the nearest picked landmark, the first landmark is the farthest node from a random start
+        nearest = shortest_distances(graph, rng.choice(starts))
+        picked = set()
+        for landmark_idx in range(min(landmarks_num, num_nodes)):
+            unreached = [node for node in range(num_nodes) if nearest[node] == inf and node not in picked]
+            if landmark_idx > 0 and unreached:
+                # no bound covers nodes which no landmark reaches, so they are picked before the far nodes
+                landmark = rng.choice([node for node in unreached if has_out_edges[node]] or unreached)
+            else:
+                landmark = max((node for node in range(num_nodes) if node not in picked),
+                               key=lambda node: nearest[node] if nearest[node] != inf else -1)
+            picked.add(landmark)
+            self.landmarks.append(landmark)
+            from_landmark = shortest_distances(graph, landmark)
+            if graph.is_directed:
+                to_landmark = shortest_distances(graph, landmark, reverse=True)
+            else:
+                to_landmark = from_landmark
+            self.from_landmarks.extend(from_landmark)
+            self.to_landmarks.extend(to_landmark)
+            nearest = from_landmark if landmark_idx == 0 else list(map(min, nearest, from_landmark))
+
+    def heuristic(self, destination: int):
+        """ Return function estimating distance from a node to the destination. """
+        inf = float('inf')
+        num_nodes, from_landmarks, to_landmarks = self.num_nodes, self.from_landmarks, self.to_landmarks
+        # bounds with an inf distance are useless, so only landmarks with finite distances to destination are kept
+        forward = [(offset, from_landmarks[offset + destination]) for offset in range(0, len(from_landmarks), num_nodes)
+                   if from_landmarks[offset + destination] != inf]
+        backward = [(offset, to_landmarks[offset + destination]) for offset in range(0, len(to_landmarks), num_nodes)
+                    if to_landmarks[offset + destination] != inf]
+
+        def estimate(node: int) -> float:
+            bound = 0
+            for offset, landmark_to_destination in forward:
+                landmark_to_node = from_landmarks[offset + node]
+                if landmark_to_destination - landmark_to_node > bound:
+                    bound = landmark_to_destination - landmark_to_node
+            for offset, destination_to_landmark in backward:
+                node_to_landmark = to_landmarks[offset + node]
+                if node_to_landmark != inf and node_to_landmark - destination_to_landmark > bound:
+                    bound = node_to_landmark - destination_to_landmark
+            return bound
+
+        return estimate
+
+
+_landmark_tables: weakref.WeakKeyDictionary[Graph, LandmarkTable] = weakref.WeakKeyDictionary()
+
+
+def get_landmark_table(graph: Graph) -> LandmarkTable:
+    """ Return landmark table of the graph, rebuilding it if the graph has changed since the last call.
+        Landmarks are picked with a private random.Random, so they are the same for the same graph
+        and the global random sequence is not touched. """
+    table = _landmark_tables.get(graph)
+    if table is None or table.version != graph.version:
+        table = LandmarkTable(graph, rng=random.Random(0))
+        _landmark_tables[graph] = table
+    return table
+
+
+def a_star(graph: Graph, source: int, destination: int, landmark_table: LandmarkTable = None):
+    """ A* search with ALT heuristic of the landmark table, by default the cached table of the graph.
+        The search stops as soon as destination is settled. Return the same as dijkstra. """
+    if landmark_table is None:
+        landmark_table = get_landmark_table(graph)
+    estimate = landmark_table.heuristic(destination)
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    distance = [float('inf')] * graph.num_nodes
+    previous = [-1] * graph.num_nodes
 
-    discovered[source] = True
     distance[source] = 0
-    heapq.heappush(heap, Node(source, 0))
+    heap = [(estimate(source), 0, source)]
 
     while heap:
-        current = heapq.heappop(heap).idx
-        discovered[current] = True
-
-        for neighbour, dist in enumerate(graph_data[current]):
-            if dist > 0:
-                new_dist = distance[current] + dist
-                if distance[neighbour] > new_dist:
-                    distance[neighbour] = new_dist
-                    previous[neighbour] = current
-
-        neighbours_with_dist = (
-            (node, distance[node]) for node, weight in enumerate((dist for dist in graph_data[current])) if weight > 0
-        )
-        for node in neighbours_with_dist:
-            if not discovered[node[0]]:
-                heapq.heappush(heap, Node(node[0], node[1] + hops_to_destination[node[0]]))
+        _, dist, current = heapq.heappop(heap)
+
+        if dist > distance[current]:
+            continue
+        if current == destination:
+            break
+
+        for slot in range(offsets[current], offsets[current + 1]):
+            weight = weights[slot]
+            if weight <= 0:
+                continue
+            neighbour = targets[slot]
+            new_dist = dist + weight
+            if new_dist < distance[neighbour]:
+                distance[neighbour] = new_dist
+                previous[neighbour] = current
+                heapq.heappush(heap, (new_dist + estimate(neighbour), new_dist, neighbour))
 
     best_route = []
     current = destination
-
-    while current != source and current != -1:
+    while current != -1:
         best_route.append(current)
         current = previous[current]
-    best_route.append(source)
     best_route.reverse()
     return best_route, distance[destination]
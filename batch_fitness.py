@@ -0,0 +1,85 @@
+import itertools
+import weakref
+import numpy as np
+from python_graph import Graph
+
+
+class EdgeWeightTable:
+    """ NumPy copy of the graph edges: sorted edge keys (n1 * num_nodes + n2) and weights of the same slots.
+        CSR rows are sorted by source and then by target, so the keys are sorted without extra work. """
+
+    def __init__(self, graph: Graph):
+        self.version = graph.version
+        self.num_nodes = graph.num_nodes
+        out_degrees = np.diff(np.frombuffer(graph.offsets, dtype=np.int32))
+        sources = np.repeat(np.arange(graph.num_nodes, dtype=np.int64), out_degrees)
+        self.keys = sources * graph.num_nodes + np.frombuffer(graph.targets, dtype=np.int32)
+        # Extra zero weight at the end is returned for keys that are not in the graph
+        self.weights = np.append(np.asarray(graph.weights, dtype=np.float64), 0.0)
+
+    def lookup(self, n1: np.ndarray, n2: np.ndarray) -> np.ndarray:
+        """ Gather weights of the edges n1 -> n2 in one pass, 0 for missing or removed edges. """
+        keys = n1.astype(np.int64) * self.num_nodes + n2
+        slots = np.searchsorted(self.keys, keys)
+        slots[slots == len(self.keys)] = len(self.keys) - 1
+        slots[self.keys[slots] != keys] = len(self.weights) - 1
+        return self.weights[slots]
+
+
+_weight_tables: weakref.WeakKeyDictionary[Graph, EdgeWeightTable] = weakref.WeakKeyDictionary()
+
+
+def get_weight_table(graph: Graph) -> EdgeWeightTable:
+    """ Return weight table of the graph, rebuilding it if the graph has changed since the last call. """
+    table = _weight_tables.get(graph)
+    if table is None or table.version != graph.version:
+        table = EdgeWeightTable(graph)
+        _weight_tables[graph] = table
+    return table
+
+
+def pack_population(population: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+    """ Pack paths into a padded int32 array (one row per path) and return it with the path lengths. """
+    lengths = np.fromiter(map(len, population), dtype=np.int32, count=len(population))
+    packed = np.zeros((len(population), max(lengths.max(), 1)), dtype=np.int32)
+    packed[np.arange(packed.shape[1]) < lengths[:, None]] = np.fromiter(
+        itertools.chain.from_iterable(population), dtype=np.int32, count=lengths.sum()
+    )
+    return packed, lengths
+
+
+def fitness_packed(packed: np.ndarray, lengths: np.ndarray, table: EdgeWeightTable) -> np.ndarray:
+    """ Calculate costs of the packed paths. Paths with a missing link cost inf. """
+    hop_weights = table.lookup(packed[:, :-1], packed[:, 1:])
+    is_hop = np.arange(packed.shape[1] - 1) < (lengths - 1)[:, None]
+    costs = np.where(is_hop, hop_weights, 0.0).sum(axis=1)
+    costs[(is_hop & (hop_weights <= 0)).any(axis=1)] = np.inf
+    return costs
+
+
+def fitness_all(population: list[list[int]], graph: Graph) -> list[float]:
+    """ Vectorized drop-in replacement for genetic_algorithm.fitness_all. """
+    if not population:
+        return []
+    packed, lengths = pack_population(population)
+    return fitness_packed(packed, lengths, get_weight_table(graph)).tolist()
+
+
+def prefix_costs_packed(packed: np.ndarray, lengths: np.ndarray, table: EdgeWeightTable) -> np.ndarray:
+    """ Calculate cumulative costs up to every node of the packed paths, inf from the first missing link on. """
+    hop_weights = table.lookup(packed[:, :-1], packed[:, 1:])
+    is_hop = np.arange(packed.shape[1] - 1) < (lengths - 1)[:, None]
+    hop_costs = np.where(hop_weights > 0, hop_weights, np.inf)
+    hop_costs[~is_hop] = 0.0
+    costs = np.zeros(packed.shape, dtype=np.float64)
+    np.cumsum(hop_costs, axis=1, out=costs[:, 1:])
+    return costs
+
+
+def prefix_costs_all(population: list[list[int]], graph: Graph) -> list[list[float]]:
+    """ Vectorized drop-in replacement for genetic_algorithm.prefix_costs_all. """
+    if not population:
+        return []
+    packed, lengths = pack_population(population)
+    costs = prefix_costs_packed(packed, lengths, get_weight_table(graph))
+    return [row[:length] for row, length in zip(costs.tolist(), lengths.tolist())]
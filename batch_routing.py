@@ -0,0 +1,140 @@
+import queue
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import as_completed, ProcessPoolExecutor, ThreadPoolExecutor
+from baseline_algorithms import follow_next_hops, reverse_dijkstra
+from genetic_algorithm import fitness, genetic, get_sub_graph_cache
+from parallel_genetic_algorithm import is_free_threaded
+from python_graph import Graph
+
+
+def route_group_genetic(graph: Graph, destination: int, sources: list[int], **options):
+    """ Run genetic algorithm for every source, the destination sub graph is built once for the whole group.
+        Sources which can not reach the destination get an empty path with inf cost, as in route_group_dijkstra. """
+    sub_graph_cache = get_sub_graph_cache(graph)
+    sub_graph_nodes, _ = sub_graph_cache.get(graph, destination)
+    reachable = set(sub_graph_nodes)
+    for source in sources:
+        if source not in reachable:
+            yield source, destination, [], float('inf')
+            continue
+        path = genetic(graph, source, destination, sub_graph_cache=sub_graph_cache, **options)
+        yield source, destination, path, fitness(path, graph)
+
+
+def route_group_dijkstra(graph: Graph, destination: int, sources: list[int], **options):
+    """ Build one shortest path tree towards the destination and read paths of all sources from it. """
+    next_hop, distance = reverse_dijkstra(graph, destination)
+    for source in sources:
+        yield source, destination, follow_next_hops(next_hop, source, destination), distance[source]
+
+
+ROUTING_ALGORITHMS = {
+    'genetic': route_group_genetic,
+    'dijkstra': route_group_dijkstra,
+}
+
+
+def group_by_destination(pairs: list[tuple[int, int]]) -> dict[int, list[int]]:
+    """ Return sources of the pairs grouped by destination. """
+    groups = defaultdict(list)
+    for source, destination in pairs:
+        groups[destination].append(source)
+    return groups
+
+
+def route_many(graph: Graph, pairs: list[tuple[int, int]], algorithm='genetic', workers=4, seed=None,
+               processes=None, **options):
+    """ Find paths for many (source, destination) pairs. Pairs are grouped by destination, so reverse reachability
+        and the sub graph are computed once per group, and groups are spread over a pool of workers.
+        Yield (source, destination, path, cost) as soon as every pair is routed, in completion order.
+        Options are passed to the routing algorithm, e.g. population_size for genetic.
+
+        Every group draws from its own random.Random seeded from seed in group order, so results of a seed do not
+        depend on the scheduling of the groups. Threads only route the CPU bound genetic groups in parallel
+        on free-threaded builds, so by default genetic groups run in a process pool on builds with the GIL
+        (processes=True forces it). Every worker process receives the graph once and the pairs of a group
+        are yielded together when the group is done. """
+    if 'rng' in options:
+        raise Exception('Pass seed instead of rng, every group gets its own random.Random.')
+    if processes is None:
+        processes = algorithm == 'genetic' and not is_free_threaded()
+    groups = group_by_destination(pairs)
+    seeds = random.Random(seed)
+    group_seeds = {destination: seeds.getrandbits(64) for destination in groups}
+
+    if processes:
+        pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(graph,))
+        try:
+            tasks = [pool.submit(route_group_in_worker, algorithm, destination, sources, group_seeds[destination],
+                                 options)
+                     for destination, sources in groups.items()]
+            for task in as_completed(tasks):
+                yield from task.result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+        return
+
+    route_group = ROUTING_ALGORITHMS[algorithm]
+    results = queue.Queue()
+
+    def run_group(destination: int, sources: list[int]) -> None:
+        try:
+            for result in route_group(graph, destination, sources, rng=random.Random(group_seeds[destination]),
+                                      **options):
+                results.put(result)
+        except BaseException as error:
+            results.put(error)
+
+    pool = ThreadPoolExecutor(workers)
+    try:
+        for destination, sources in groups.items():
+            pool.submit(run_group, destination, sources)
+        for _ in range(len(pairs)):
+            result = results.get()
+            if isinstance(result, BaseException):
+                raise result
+            yield result
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+# Graph of the current worker process, set once by the pool initializer
+_worker_graph: Graph = None
+
+
+def init_worker(graph: Graph) -> None:
+    global _worker_graph
+    _worker_graph = graph
+
+
+def route_group_in_worker(algorithm: str, destination: int, sources: list[int], seed: int,
+                          options: dict) -> list[tuple[int, int, list[int], float]]:
+    return list(ROUTING_ALGORITHMS[algorithm](
+        _worker_graph, destination, sources, rng=random.Random(seed), **options
+    ))
+
+
+def main():
+    from topology import build_fat_tree_graph
+
+    fat_tree_topology, graph = build_fat_tree_graph(16)
+    hosts = fat_tree_topology.hosts()
+
+    pairs = [(source, destination) for destination in hosts for source in hosts if source != destination]
+    start = time.perf_counter()
+    routed = sum(1 for _ in route_many(graph, pairs, algorithm='dijkstra'))
+    elapsed = time.perf_counter() - start
+    print(f"Dijkstra: {routed} pairs in {elapsed:.2f} sec, {routed / elapsed:.0f} pairs/sec")
+
+    # Genetic algorithm is far slower per pair, so route only a part of hosts towards a few destinations
+    pairs = [(source, destination) for destination in hosts[-4:] for source in hosts[:64]]
+    start = time.perf_counter()
+    routed = sum(1 for _ in route_many(graph, pairs, algorithm='genetic', population_size=32))
+    elapsed = time.perf_counter() - start
+    print(f"Genetic: {routed} pairs in {elapsed:.2f} sec, {routed / elapsed:.0f} pairs/sec")
+
+
+if __name__ == '__main__':
+    main()
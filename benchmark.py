@@ -0,0 +1,326 @@
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import networkx as nx
+import baseline_algorithms
+import genetic_algorithm
+import packed_population
+import parallel_genetic_algorithm
+import python_graph
+from fnss_importer import fnss
+from topology import build_fat_tree_graph
+
+
+def fat_tree_family(size: int, rng: random.Random):
+    """ fnss fat tree with k = size, link weights depend on the link type like in topology.py. """
+    fat_tree_topology, graph = build_fat_tree_graph(size, rng)
+    return graph, fat_tree_topology.hosts()
+
+
+def random_family(size: int, rng: random.Random):
+    """ Directed graph of python_graph.generate_random_weighted_edges with size nodes, every node is an endpoint. """
+    edges = [(n1, n2, {'weight': weight})
+             for n1, n2, weight in python_graph.generate_random_weighted_edges(size, seed=rng.randrange(2 ** 32))]
+    return python_graph.Graph(size, edges, is_directed=True), list(range(size))
+
+
+def fnss_family(build_topology):
+    """ Wrap fnss topology generator into a family with random link weights from 1 to 100.
+        Endpoints are hosts of datacenter topologies and all nodes of others. """
+
+    def family(size: int, rng: random.Random):
+        fnss_topology = nx.convert_node_labels_to_integers(build_topology(size, rng))
+        edges = [(src, dst, {'weight': rng.randint(1, 100)}) for src, dst in fnss_topology.edges()]
+        graph = python_graph.Graph(fnss_topology.number_of_nodes(), edges, is_directed=False)
+        hosts = [node for node, data in fnss_topology.nodes(data=True) if data.get('type') == 'host']
+        return graph, hosts or list(fnss_topology.nodes())
+
+    return family
+
+
+TOPOLOGY_FAMILIES = {
+    'fat_tree': fat_tree_family,
+    'random': random_family,
+    'two_tier': fnss_family(lambda size, rng: fnss.two_tier_topology(size, 2 * size, 4)),
+    'three_tier': fnss_family(lambda size, rng: fnss.three_tier_topology(size, 2 * size, 4 * size, 4)),
+    'bcube': fnss_family(lambda size, rng: fnss.bcube_topology(size, 1)),
+    'barabasi_albert': fnss_family(
+        lambda size, rng: fnss.barabasi_albert_topology(size, 2, 3, seed=rng.randrange(2 ** 32))
+    ),
+}
+
+DEFAULT_SIZES = {
+    'fat_tree': [4, 8],
+    'random': [200, 1000],
+    'two_tier': [8],
+    'three_tier': [2],
+    'bcube': [4],
+    'barabasi_albert': [500],
+}
+
+
+def genetic_engine(graph: python_graph.Graph, population_size: int, seed: int):
+    rng = random.Random(seed)
+    return lambda source, destination: genetic_algorithm.genetic(
+        graph, source, destination, population_size=population_size, rng=rng
+    )
+
+
+def packed_genetic_engine(graph: python_graph.Graph, population_size: int, seed: int):
+    """ genetic_engine on the packed population, to compare its flat buffers with lists of paths. """
+    rng = random.Random(seed)
+    return lambda source, destination: packed_population.packed_genetic(
+        graph, source, destination, population_size=population_size, rng=rng
+    )
+
+
+def parallel_genetic_engine(graph: python_graph.Graph, population_size: int, seed: int):
+    return parallel_genetic_algorithm.ParallelGenetic(graph, population_size, cpus=4, seed=seed).genetic
+
+
+def baseline_engine(algorithm):
+    """ Wrap baseline algorithm, which returns the path first, into an engine. """
+
+    def engine(graph: python_graph.Graph, population_size: int, seed: int):
+        return lambda source, destination: algorithm(graph, source, destination)[0]
+
+    return engine
+
+
+def a_star_engine(graph: python_graph.Graph, population_size: int, seed: int):
+    """ ALT A*, the landmark table is precomputed before the queries like on a static fabric. """
+    landmark_table = baseline_algorithms.get_landmark_table(graph)
+    return lambda source, destination: baseline_algorithms.a_star(graph, source, destination, landmark_table)[0]
+
+
+ENGINES = {
+    'genetic': genetic_engine,
+    'packed_genetic': packed_genetic_engine,
+    'parallel_genetic': parallel_genetic_engine,
+    'dijkstra': baseline_engine(baseline_algorithms.dijkstra),
+    'bidirectional_dijkstra': baseline_engine(baseline_algorithms.bidirectional_dijkstra),
+    'a_star': a_star_engine,
+    'bfs': baseline_engine(baseline_algorithms.bfs),
+}
+
+
+def close_engine(engine) -> None:
+    """ Shut down thread pool of the engine if it has one. """
+    owner = getattr(engine, '__self__', None)
+    if owner is not None and getattr(owner, 'pool', None) is not None:
+        owner.pool.shutdown()
+
+
+def pick_queries(graph: python_graph.Graph, endpoints: list[int], queries_num: int, rng: random.Random
+                 ) -> list[tuple[int, int, float]]:
+    """ Pick random (source, destination) pairs of endpoints which are connected,
+        with their Dijkstra cost as the reference cost. """
+    queries = []
+    attempts = 0
+    while len(queries) < queries_num and attempts < 20 * queries_num:
+        attempts += 1
+        source, destination = rng.sample(endpoints, 2)
+        _, cost = baseline_algorithms.bidirectional_dijkstra(graph, source, destination)
+        if cost != float('inf'):
+            queries.append((source, destination, cost))
+    return queries
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """ Nearest rank percentile of the sorted values. """
+    if not sorted_values:
+        return float('nan')
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def path_cost(path: list[int], source: int, destination: int, graph: python_graph.Graph) -> float:
+    """ Cost of the path, inf if it is not a path from source to destination. """
+    if not path or path[0] != source or path[-1] != destination:
+        return float('inf')
+    return genetic_algorithm.fitness(path, graph)
+
+
+def run_engine(engine_name: str, graph: python_graph.Graph, queries: list[tuple[int, int, float]],
+               population_size: int, seed: int, memory_queries_num: int) -> dict:
+    """ Run all queries with the engine and measure them. Wall time and latencies come from a pass without
+        tracing, peak memory from a second traced pass over the first memory_queries_num queries. """
+    engine = ENGINES[engine_name](graph, population_size, seed)
+    latencies, cost_ratios = [], []
+    failures = 0
+    try:
+        start = time.perf_counter()
+        for source, destination, reference_cost in queries:
+            query_start = time.perf_counter()
+            try:
+                path = engine(source, destination)
+            except Exception:
+                path = []
+            latencies.append(time.perf_counter() - query_start)
+            cost = path_cost(path, source, destination, graph)
+            if cost == float('inf'):
+                failures += 1
+            else:
+                cost_ratios.append(cost / reference_cost if reference_cost else 1.0)
+        wall_time = time.perf_counter() - start
+
+        tracemalloc.start()
+        for source, destination, _ in queries[:memory_queries_num]:
+            try:
+                engine(source, destination)
+            except Exception:
+                pass
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        close_engine(engine)
+
+    latencies.sort()
+    return {
+        'engine': engine_name,
+        'queries': len(queries),
+        'wall_time': wall_time,
+        'latency_ms': {
+            name: percentile(latencies, pct) * 1000
+            for name, pct in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))
+        },
+        'peak_memory_kb': peak_memory / 1024,
+        'cost_ratio': {
+            'mean': sum(cost_ratios) / len(cost_ratios) if cost_ratios else None,
+            'max': max(cost_ratios) if cost_ratios else None,
+        },
+        'failures': failures,
+    }
+
+
+def run_suite(sizes: dict[str, list[int]], engines: list[str], queries_num=50, population_pct=0.16, seed=123,
+              memory_queries_num=5, log=print) -> dict:
+    """ Run every engine on every topology family and size. Return results ready to be dumped to JSON. """
+    results = []
+    for family, family_sizes in sizes.items():
+        for size in family_sizes:
+            rng = random.Random(f'{seed}-{family}-{size}')
+            graph, endpoints = TOPOLOGY_FAMILIES[family](size, rng)
+            queries = pick_queries(graph, endpoints, queries_num, rng)
+            population_size = math.ceil(graph.num_nodes * population_pct)
+            for engine_name in engines:
+                result = run_engine(engine_name, graph, queries, population_size, seed, memory_queries_num)
+                result.update({'family': family, 'size': size, 'nodes': graph.num_nodes, 'edges': graph.num_edges})
+                results.append(result)
+                log(format_result(result))
+    return {
+        'meta': {
+            'python': sys.version,
+            'platform': platform.platform(),
+            'free_threaded': parallel_genetic_algorithm.is_free_threaded(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'queries': queries_num,
+            'population_pct': population_pct,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def format_result(result: dict) -> str:
+    cost_ratio = result['cost_ratio']['mean']
+    return (f"{result['family']}:{result['size']} {result['engine']:<22} {result['wall_time']:8.3f} sec"
+            f"  p50 {result['latency_ms']['p50']:8.2f} ms  p99 {result['latency_ms']['p99']:8.2f} ms"
+            f"  peak {result['peak_memory_kb']:9.1f} KB"
+            f"  cost x{cost_ratio if cost_ratio is not None else float('nan'):.3f}  failures {result['failures']}")
+
+
+def compare(baseline: dict, current: dict, threshold=0.2, cost_tolerance=0.01) -> list[str]:
+    """ Compare results of the same family, size and engine. Return regressions: wall time, p99 latency or peak
+        memory grown by more than threshold share, mean cost ratio grown by more than cost_tolerance
+        or more failed queries. """
+
+    def key(result: dict) -> tuple:
+        return result['family'], result['size'], result['engine']
+
+    baseline_results = {key(result): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = baseline_results.get(key(result))
+        if old is None:
+            continue
+        name = '{}:{} {}'.format(*key(result))
+        for metric, old_value, new_value in (
+                ('wall_time', old['wall_time'], result['wall_time']),
+                ('p99 latency', old['latency_ms']['p99'], result['latency_ms']['p99']),
+                ('peak memory', old['peak_memory_kb'], result['peak_memory_kb'])):
+            if new_value > old_value * (1 + threshold):
+                regressions.append(f'{name}: {metric} {old_value:.3f} -> {new_value:.3f}')
+        old_cost, new_cost = old['cost_ratio']['mean'], result['cost_ratio']['mean']
+        if old_cost is not None and new_cost is not None and new_cost > old_cost + cost_tolerance:
+            regressions.append(f'{name}: cost ratio {old_cost:.3f} -> {new_cost:.3f}')
+        if result['failures'] > old['failures']:
+            regressions.append(f"{name}: failures {old['failures']} -> {result['failures']}")
+    return regressions
+
+
+def parse_sizes(specs: list[str]) -> dict[str, list[int]]:
+    """ Parse family:size[,size...] specs, e.g. fat_tree:4,8 random:1000. """
+    sizes = {}
+    for spec in specs:
+        family, _, family_sizes = spec.partition(':')
+        if family not in TOPOLOGY_FAMILIES:
+            raise Exception(f'Unknown topology family {family}, use one of {", ".join(TOPOLOGY_FAMILIES)}.')
+        sizes[family] = [int(size) for size in family_sizes.split(',')] if family_sizes else DEFAULT_SIZES[family]
+    return sizes
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark path finding engines on generated topologies.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmark suite')
+    run.add_argument('--topologies', nargs='+', default=[f'{family}:{",".join(map(str, family_sizes))}'
+                                                         for family, family_sizes in DEFAULT_SIZES.items()],
+                     help='family:size[,size...] specs, families: ' + ', '.join(TOPOLOGY_FAMILIES))
+    run.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    run.add_argument('--queries', type=int, default=50)
+    run.add_argument('--population-pct', type=float, default=0.16, help='population size as a share of nodes')
+    run.add_argument('--memory-queries', type=int, default=5, help='queries traced for peak memory')
+    run.add_argument('--seed', type=int, default=123)
+    run.add_argument('--output', help='JSON file for results')
+    run.add_argument('--baseline', help='JSON file of a previous run to compare with')
+    run.add_argument('--threshold', type=float, default=0.2)
+
+    compare_parser = commands.add_parser('compare', help='compare two saved runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        report = run_suite(parse_sizes(args.topologies), args.engines, args.queries, args.population_pct, args.seed,
+                           args.memory_queries)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(report, file, indent=2)
+        if not args.baseline:
+            return 0
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    else:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            report = json.load(file)
+
+    regressions = compare(baseline, report, args.threshold)
+    for regression in regressions:
+        print('REGRESSION', regression)
+    if not regressions:
+        print('No regressions')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
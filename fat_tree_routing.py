@@ -0,0 +1,90 @@
+import random
+import networkx as nx
+from python_graph import Graph
+
+
+# Level of the node in the fat tree, paths only climb and then descend these levels
+LAYER_TO_LEVEL = {'leaf': 0, 'edge': 1, 'aggregation': 2, 'core': 3}
+LINK_TYPES = {'edge_leaf', 'aggregation_edge', 'core_aggregation'}
+
+
+class FatTreeRouter():
+    """ Up/down paths of fnss fat tree topology, enumerated from the node roles instead of graph search.
+
+        Every node climbs to a top node (edge switch, aggregation switch or core switch) and descends to the
+        destination. Tops are the lowest common ancestors of both endpoints: the shared edge switch of hosts
+        on the same edge, any aggregation switch of the shared pod, otherwise any core switch. Such paths are
+        the valley free paths of the fabric, a path through a valley (e.g. edge -> aggregation -> edge) may be
+        cheaper in a randomly weighted fat tree, so use dijkstra when the global optimum is needed. """
+
+    def __init__(self, topology: nx.Graph):
+        self.levels: dict[int, int] = {}
+        for node, data in topology.nodes(data=True):
+            if data.get('type') == 'host':
+                self.levels[node] = 0
+            elif data.get('layer') in LAYER_TO_LEVEL:
+                self.levels[node] = LAYER_TO_LEVEL[data['layer']]
+            else:
+                raise Exception(f'Node {node} has no fat tree layer.')
+
+        self.up_neighbours: dict[int, list[int]] = {node: [] for node in self.levels}
+        for src, dst, data in topology.edges(data=True):
+            if 'type' in data and data['type'] not in LINK_TYPES:
+                raise Exception(f"Link {src}-{dst} of type {data['type']} is not a fat tree link.")
+            if abs(self.levels[src] - self.levels[dst]) != 1:
+                raise Exception(f'Link {src}-{dst} does not connect adjacent fat tree layers.')
+            lower, upper = (src, dst) if self.levels[src] < self.levels[dst] else (dst, src)
+            self.up_neighbours[lower].append(upper)
+        for neighbours in self.up_neighbours.values():
+            neighbours.sort()
+
+    def up_paths(self, node: int) -> list[list[int]]:
+        """ Return all paths which start at the node and only climb, including the path of the node alone. """
+        paths = [[node]]
+        for up_neighbour in self.up_neighbours[node]:
+            paths.extend([node] + path for path in self.up_paths(up_neighbour))
+        return paths
+
+    def up_down_paths(self, source: int, destination: int) -> list[list[int]]:
+        """ Return all shortest up/down paths from source to destination, empty list if there are none. """
+        source_tops: dict[int, list[list[int]]] = {}
+        for path in self.up_paths(source):
+            source_tops.setdefault(path[-1], []).append(path)
+        destination_tops: dict[int, list[list[int]]] = {}
+        for path in self.up_paths(destination):
+            if path[-1] in source_tops:
+                destination_tops.setdefault(path[-1], []).append(path)
+        if not destination_tops:
+            return []
+
+        # levels grow by one on every climb, so all paths through the lowest tops have the same length
+        top_level = min(self.levels[top] for top in destination_tops)
+        return [up_path + down_path[-2::-1]
+                for top, down_paths in destination_tops.items() if self.levels[top] == top_level
+                for up_path in source_tops[top] for down_path in down_paths]
+
+    def sample(self, source: int, destination: int, paths_num: int, rng=random) -> list[list[int]]:
+        """ Return paths_num random up/down paths, distinct while there are enough of them.
+            Raise exception if destination can not be reached by an up/down path. """
+        paths = self.up_down_paths(source, destination)
+        if not paths:
+            raise Exception(f'Destination {destination} is unreachable from {source}.')
+        if paths_num <= len(paths):
+            return rng.sample(paths, paths_num)
+        return paths + [rng.choice(paths).copy() for _ in range(paths_num - len(paths))]
+
+    def shortest_path(self, source: int, destination: int, graph: Graph):
+        """ Cheapest up/down path by the graph weights. Return the path and its cost,
+            the path is [destination] with inf cost if there is no up/down path with all links up. """
+        best_path, best_cost = [destination], float('inf')
+        for path in self.up_down_paths(source, destination):
+            cost = 0
+            for n1, n2 in zip(path, path[1:]):
+                weight = graph.weight(n1, n2)
+                if weight == 0:
+                    cost = float('inf')
+                    break
+                cost += weight
+            if cost < best_cost:
+                best_path, best_cost = path, cost
+        return best_path, best_cost
@@ -1,43 +1,221 @@
 import random
-
-
-def reverse_dfs(destination: int, graph_data: list[list[int]]) -> list[int]:
-    """ Returns list of nodes from which destination is reachable. """
-    num_nodes = len(graph_data)
+import sys
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from python_graph import Graph
+
+
+def reverse_dfs(destination: int, graph: Graph) -> list[int]:
+    """ Returns list of nodes from which destination is reachable. Walks incoming edges, so it is O(V + E). """
     stack = [destination]
-    visited = [False] * num_nodes
+    visited = [False] * graph.num_nodes
+    visited[destination] = True
 
     while stack:
         current = stack.pop()
-        for neighbour in range(num_nodes):
-            if graph_data[neighbour][current] > 0 and not visited[neighbour]:
+        for neighbour in graph.predecessors(current):
+            if not visited[neighbour]:
+                visited[neighbour] = True
                 stack.append(neighbour)
-        visited[current] = True
 
     nodes = [node for node, reached in enumerate(visited) if reached]
     return nodes
 
 
-def create_sub_graph_adj_lists(sub_graph_nodes: list[int], graph_data: list[list[int]]) -> dict[int, list[int]]:
+def create_sub_graph_adj_lists(sub_graph_nodes: list[int], graph: Graph) -> dict[int, list[int]]:
     """ Create sub graph adjacency list with edges only among nodes in the nodes list. Return sub graph adj list. """
-    sub_graph_adj_lists = dict((sub_node, []) for sub_node in sub_graph_nodes)
+    sub_graph_node_set = set(sub_graph_nodes)
+    sub_graph_adj_lists = {}
     for sub_node in sub_graph_nodes:
-        for edge in sub_graph_nodes:
-            edge_weight = graph_data[sub_node][edge]
-            if edge_weight > 0:
-                sub_graph_adj_lists[sub_node].append(edge)
+        sub_graph_adj_lists[sub_node] = [edge for edge in graph.neighbours(sub_node) if edge in sub_graph_node_set]
     return sub_graph_adj_lists
 
 
+class BypassIndex():
+    """ Map pairs of nodes (u, w) two hops apart to the nodes v with links u -> v -> w, so mutation finds
+        alternatives to the middle node of three without scanning adjacency lists. Pairs are filled on their first
+        lookup, so the index only holds the pairs mutations have asked for.
+
+        One index serves the sub graphs of all destinations: every node with a link into a sub graph node reaches
+        the destination as well, so the bypasses of sub graph nodes u and w all lie in the sub graph. """
+
+    def __init__(self, graph: Graph):
+        # CSR arrays do not reference the graph, so the index does not keep the graph alive in the sub graph cache
+        self._offsets, self._targets, self._weights = graph.offsets, graph.targets, graph.weights
+        self._bypasses: dict[tuple[int, int], list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._bypasses)
+
+    def get(self, pair: tuple[int, int], default=None) -> list[int]:
+        """ Return nodes v with links u -> v -> w of the pair (u, w), empty list if there are none. """
+        bypasses = self._bypasses.get(pair)
+        if bypasses is None:
+            bypasses = self._bypasses[pair] = self._find_bypasses(*pair)
+        return bypasses
+
+    def _has_link(self, v: int, w: int) -> bool:
+        # targets of every node are sorted
+        start, end = self._offsets[v], self._offsets[v + 1]
+        slot = bisect_left(self._targets, w, start, end)
+        return slot < end and self._targets[slot] == w and self._weights[slot] > 0
+
+    def _find_bypasses(self, u: int, w: int) -> list[int]:
+        if u == w:
+            return []
+        offsets, targets, weights = self._offsets, self._targets, self._weights
+        return [targets[slot] for slot in range(offsets[u], offsets[u + 1])
+                if weights[slot] > 0 and self._has_link(targets[slot], w)]
+
+
+class GeneticStats():
+    """ Optional instrumentation of genetic runs. Keeps cumulative time of every phase, counters of operator
+        calls and results, termination reasons and calls on_generation(generation, best cost, mean cost)
+        after every generation. Pass it as stats to genetic() or set it as ParallelGenetic.stats.
+        Without stats the algorithm only pays for a few `stats is not None` checks per generation. """
+
+    def __init__(self, on_generation=None):
+        self.on_generation = on_generation
+        self.phase_times: defaultdict[str, float] = defaultdict(float)
+        self.counters: defaultdict[str, int] = defaultdict(int)
+        self.terminations: defaultdict[str, int] = defaultdict(int)
+        self.last_termination = None
+
+    def record(self, phase: str, start: float, **counters: int) -> float:
+        """ Add time since start to the phase and add the counters. Return current time,
+            so the next phase can start from it. """
+        now = time.perf_counter()
+        self.phase_times[phase] += now - start
+        for name, value in counters.items():
+            self.counters[name] += value
+        return now
+
+    def generation_done(self, generation: int, path_lengths: list[float]) -> None:
+        self.counters['generations'] += 1
+        if self.on_generation is not None:
+            finite_lengths = [path_length for path_length in path_lengths if path_length != float('inf')]
+            mean_length = sum(finite_lengths) / len(finite_lengths) if finite_lengths else float('inf')
+            self.on_generation(generation, min(path_lengths), mean_length)
+
+    def terminate(self, reason: str) -> None:
+        """ Count finished run, reason is 'max_generations', 'unimproved' or 'no_survivors'. """
+        self.counters['runs'] += 1
+        self.terminations[reason] += 1
+        self.last_termination = reason
+
+    def report(self) -> dict:
+        return {
+            'phase_times': dict(self.phase_times),
+            'counters': dict(self.counters),
+            'terminations': dict(self.terminations),
+            'last_termination': self.last_termination,
+        }
+
+
+def sub_graph_size(sub_graph_nodes: list[int], sub_graph_adj_lists: dict[int, list[int]]) -> int:
+    """ Approximate memory of the sub graph in bytes, node objects are not counted. """
+    return (sys.getsizeof(sub_graph_nodes) + sys.getsizeof(sub_graph_adj_lists)
+            + sum(map(sys.getsizeof, sub_graph_adj_lists.values())))
+
+
+class SubGraphCache:
+    """ LRU cache of (sub graph nodes, sub graph adjacency lists) keyed by destination and graph version, bounded
+        by the approximate memory of the sub graphs. It also holds one bypass index of the current graph version.
+        Any edge change bumps the graph version, which drops all cached sub graphs on the next lookup.
+        Safe to share between threads, sub graphs are built outside of the lock. """
+
+    def __init__(self, max_memory=256 * 2 ** 20):
+        self.max_memory = max_memory
+        self._graph_version = None
+        self._memory = 0
+        # entry is (sub graph nodes, sub graph adjacency lists, size in bytes)
+        self._entries: OrderedDict[tuple[int, int], tuple[list[int], dict[int, list[int]], int]] = OrderedDict()
+        self._bypass_index: BypassIndex = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, graph: Graph) -> None:
+        # called under the lock
+        if self._graph_version != graph.version:
+            self._entries.clear()
+            self._memory = 0
+            self._bypass_index = None
+            self._graph_version = graph.version
+
+    def get(self, graph: Graph, destination: int, stats: GeneticStats = None
+            ) -> tuple[list[int], dict[int, list[int]]]:
+        """ Return nodes from which destination is reachable and adjacency lists of the sub graph among them. """
+        key = (destination, graph.version)
+        with self._lock:
+            self._check_version(graph)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if stats is not None:
+                    stats.counters['sub_graph_cache_hits'] += 1
+                return entry[0], entry[1]
+
+        if stats is not None:
+            phase_start = time.perf_counter()
+        sub_graph_nodes = reverse_dfs(destination, graph)
+        if stats is not None:
+            phase_start = stats.record('reverse_dfs', phase_start, sub_graph_cache_misses=1)
+        sub_graph_adj_lists = create_sub_graph_adj_lists(sub_graph_nodes, graph)
+        if stats is not None:
+            stats.record('sub_graph_adj_lists', phase_start)
+        size = sub_graph_size(sub_graph_nodes, sub_graph_adj_lists)
+        with self._lock:
+            if self._graph_version == graph.version and key not in self._entries:
+                self._entries[key] = (sub_graph_nodes, sub_graph_adj_lists, size)
+                self._memory += size
+                # the newest entry stays even if it alone is over the limit
+                while self._memory > self.max_memory and len(self._entries) > 1:
+                    self._memory -= self._entries.popitem(last=False)[1][2]
+        return sub_graph_nodes, sub_graph_adj_lists
+
+    def get_bypass_index(self, graph: Graph) -> BypassIndex:
+        """ Return bypass index of the current graph version, shared by the sub graphs of all destinations. """
+        with self._lock:
+            self._check_version(graph)
+            if self._bypass_index is None:
+                self._bypass_index = BypassIndex(graph)
+            return self._bypass_index
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._memory = 0
+            self._bypass_index = None
+
+
+_sub_graph_caches: weakref.WeakKeyDictionary[Graph, SubGraphCache] = weakref.WeakKeyDictionary()
+
+
+def get_sub_graph_cache(graph: Graph) -> SubGraphCache:
+    """ Return sub graph cache shared by all genetic engines working on the graph. """
+    cache = _sub_graph_caches.get(graph)
+    if cache is None:
+        cache = SubGraphCache()
+        _sub_graph_caches[graph] = cache
+    return cache
+
+
 def randomized_dfs(
-        source: int, destination: int, sub_nodes: list[int], sub_graph_adj_lists: dict[int, list[int]]) -> list[int]:
-    """ Returns random path from source to destination on the sub graph. """
+        source: int, destination: int, sub_nodes: list[int], sub_graph_adj_lists: dict[int, list[int]],
+        rng=random, blocked=()) -> list[int]:
+    """ Returns random path from source to destination on the sub graph which does not pass blocked nodes.
+        Returns empty path if destination is unreachable. """
     stack = [source]
     visited = dict((node, False) for node in sub_nodes)
     previous = dict((node, -1) for node in sub_nodes)
+    for node in blocked:
+        visited[node] = True
     visited[source] = True
 
-    while not visited[destination] or not stack:
+    while not visited[destination] and stack:
         current = stack.pop()
 
         neighbours = []
@@ -46,9 +224,12 @@ def randomized_dfs(
                 visited[neigh] = True
                 previous[neigh] = current
                 neighbours.append(neigh)
-        random.shuffle(neighbours)  # can be improved
+        rng.shuffle(neighbours)  # can be improved
         stack.extend(neighbours)
 
+    if previous[destination] == -1 and destination != source:
+        return []
+
     path = []
     current = destination
     while current != -1:
@@ -59,14 +240,88 @@ def randomized_dfs(
     return path
 
 
-def fitness(path: list[int], graph_data: list[list[int]]) -> float:
+class PathSampler():
+    """ Draws random paths on the sub graph the same way randomized_dfs does, but keeps the search state
+        in arrays indexed by position of the node in sub_graph_nodes. The arrays are built once and reused
+        by every path, a node counts as visited if its mark equals the mark of the current search.
+        Not thread safe, every thread needs its own sampler. """
+
+    def __init__(self, sub_graph_nodes: list[int], sub_graph_adj_lists: dict[int, list[int]]):
+        self.nodes = list(sub_graph_nodes)
+        self.node_ids = {node: idx for idx, node in enumerate(self.nodes)}
+        self.adj_lists = [[self.node_ids[neigh] for neigh in sub_graph_adj_lists[node]] for node in self.nodes]
+        self.visited = array('i', [0]) * len(self.nodes)
+        self.previous = array('i', [-1]) * len(self.nodes)
+        self.mark = 0
+
+    def path(self, source: int, destination: int, rng=random, blocked=()) -> list[int]:
+        """ Returns random path from source to destination which does not pass blocked nodes.
+            Returns empty path if destination is unreachable. """
+        node_ids = self.node_ids
+        if source not in node_ids or destination not in node_ids:
+            return []
+        source_id, destination_id = node_ids[source], node_ids[destination]
+        visited, previous, adj_lists = self.visited, self.previous, self.adj_lists
+        if self.mark == 2 ** 31 - 1:
+            self.visited = visited = array('i', [0]) * len(self.nodes)
+            self.mark = 0
+        self.mark += 1
+        mark = self.mark
+
+        for node in blocked:
+            if node in node_ids:
+                visited[node_ids[node]] = mark
+        visited[source_id] = mark
+        previous[source_id] = -1
+        previous[destination_id] = -1
+        stack = [source_id]
+
+        while visited[destination_id] != mark and stack:
+            current = stack.pop()
+
+            neighbours = []
+            for neigh in adj_lists[current]:
+                if visited[neigh] != mark:
+                    visited[neigh] = mark
+                    previous[neigh] = current
+                    neighbours.append(neigh)
+            # shuffle of less than two nodes draws no random numbers, so skipping it keeps paths the same
+            if len(neighbours) > 1:
+                rng.shuffle(neighbours)
+            stack.extend(neighbours)
+
+        if previous[destination_id] == -1 and destination_id != source_id:
+            return []
+
+        path = []
+        current = destination_id
+        while current != -1:
+            path.append(self.nodes[current])
+            current = previous[current]
+        path.reverse()
+
+        return path
+
+    def sample(self, source: int, destination: int, paths_num: int, rng=random) -> list[list[int]]:
+        """ Draw paths_num random paths from source to destination.
+            Raises exception if destination is unreachable from source. """
+        paths = []
+        for _ in range(paths_num):
+            path = self.path(source, destination, rng)
+            if not path:
+                raise Exception(f'Destination {destination} is unreachable from {source}.')
+            paths.append(path)
+        return paths
+
+
+def fitness(path: list[int], graph: Graph) -> float:
     """ Calculate path cost. Returns inf if the nodes are not connected. """
     path_cost = 0
     for idx in range(len(path) - 1):
         n1, n2 = path[idx], path[idx + 1]
-        edge_cost = graph_data[n1][n2]
+        edge_cost = graph.weight(n1, n2)
         if edge_cost != 0:
-            path_cost += graph_data[n1][n2]
+            path_cost += edge_cost
         else:
             path_cost = float('inf')
             break
@@ -74,16 +329,17 @@ def fitness(path: list[int], graph_data: list[list[int]]) -> float:
     return path_cost
 
 
-def fitness_all(population: list[list[int]], graph_data: list[list[int]]) -> list[float]:
+def fitness_all(population: list[list[int]], graph: Graph) -> list[float]:
     """ Calculate all path costs of the population. """
+    weight = graph.weight
     results = []
     for path in population:
         path_cost = 0
         for idx in range(len(path) - 1):
             n1, n2 = path[idx], path[idx + 1]
-            edge_cost = graph_data[n1][n2]
+            edge_cost = weight(n1, n2)
             if edge_cost != 0:
-                path_cost += graph_data[n1][n2]
+                path_cost += edge_cost
             else:
                 path_cost = float('inf')
                 break
@@ -91,58 +347,230 @@ def fitness_all(population: list[list[int]], graph_data: list[list[int]]) -> lis
     return results
 
 
+def prefix_costs(path: list[int], graph: Graph) -> list[float]:
+    """ Calculate cumulative path cost up to every node of the path, the first one is 0 and the last one is
+        the path cost. Costs from the first missing link onwards are inf. """
+    weight = graph.weight
+    path_cost = 0
+    costs = [path_cost]
+    for idx in range(len(path) - 1):
+        edge_cost = weight(path[idx], path[idx + 1])
+        if edge_cost != 0:
+            path_cost += edge_cost
+        else:
+            path_cost = float('inf')
+        costs.append(path_cost)
+    return costs
+
+
+def prefix_costs_all(population: list[list[int]], graph: Graph) -> list[list[float]]:
+    """ Calculate prefix costs of all paths of the population. """
+    return [prefix_costs(path, graph) for path in population]
+
+
 def generate_initial_population(
         source: int, destination: int, population_size: int, sub_graph_nodes: list[int],
-        sub_graph_adj_lists: dict[int, list[int]]
+        sub_graph_adj_lists: dict[int, list[int]], rng=random, seed_paths: list[list[int]] = (), seed_ratio=0.25
 ) -> list[list[int]]:
-    """ Creates random sample of possible paths from source to destination. """
+    """ Creates random sample of possible paths from source to destination.
+        Up to seed_ratio of the population is taken from seed paths (e.g. previous best routes or Dijkstra
+        result), seeds which can not be turned into a valid path on the sub graph are skipped. """
+
+    seeds = []
+    max_seeds_num = round(population_size * seed_ratio)
+    for seed_path in seed_paths:
+        if len(seeds) >= max_seeds_num:
+            break
+        path = adapt_seed_path(seed_path, source, destination, sub_graph_nodes, sub_graph_adj_lists, rng)
+        if path:
+            seeds.append(path)
 
-    population = [[] for _ in range(population_size)]
-    for idx in range(population_size):
-        population[idx] = randomized_dfs(source, destination, sub_graph_nodes, sub_graph_adj_lists)
+    population = seeds[:population_size]
+    sampler = PathSampler(sub_graph_nodes, sub_graph_adj_lists)
+    population.extend(sampler.sample(source, destination, population_size - len(population), rng))
 
     return population
 
 
-def selection(path_lengths: list[float], remain_pct=0.5, reverse_prob=False, preserve_best=False) -> list[int]:
-    """ Randomly pick selected percent of paths of the population based on their fitness.
-        Return ids of selected paths. """
-    remain_num = round(len(path_lengths) * remain_pct)
+def adapt_seed_path(
+        path: list[int], source: int, destination: int, sub_graph_nodes: list[int],
+        sub_graph_adj_lists: dict[int, list[int]], rng=random
+) -> list[int]:
+    """ Turn the seed path into a path from source to destination on the sub graph. Path which passes destination
+        is cut there, path to another destination (e.g. a neighbouring host) is extended by a random path
+        from its end. Return new path or empty path if the seed does not fit. """
+    if not path or path[0] != source:
+        return []
+    if destination in path:
+        path = path[:path.index(destination) + 1]
 
-    if remain_num < 1:
+    for idx in range(len(path) - 1):
+        if path[idx] not in sub_graph_adj_lists or path[idx + 1] not in sub_graph_adj_lists[path[idx]]:
+            return []
+
+    if path[-1] == destination:
+        return path.copy()
+    if path[-1] not in sub_graph_adj_lists:
         return []
+    extension = randomized_dfs(path[-1], destination, sub_graph_nodes, sub_graph_adj_lists, rng, set(path[:-1]))
+    if not extension:
+        return []
+    return path[:-1] + extension
+
+
+class FenwickTree:
+    """ Binary indexed tree over non-negative weights. Supports weight updates and
+        picking an index by a point on the cumulative weight line in O(log n). """
+
+    def __init__(self, weights: list[float]):
+        self.size = len(weights)
+        self.tree = [0.0] + list(weights)
+        for idx in range(1, self.size + 1):
+            parent = idx + (idx & -idx)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[idx]
+        self.top_bit = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+    def add(self, idx: int, delta: float) -> None:
+        idx += 1
+        while idx <= self.size:
+            self.tree[idx] += delta
+            idx += idx & -idx
+
+    def total(self) -> float:
+        result = 0.0
+        idx = self.size
+        while idx > 0:
+            result += self.tree[idx]
+            idx -= idx & -idx
+        return result
+
+    def find(self, point: float) -> int:
+        """ Return the first index whose cumulative weight exceeds the point. """
+        position = 0
+        step = self.top_bit
+        while step:
+            next_position = position + step
+            if next_position <= self.size and self.tree[next_position] <= point:
+                position = next_position
+                point -= self.tree[next_position]
+            step >>= 1
+        return position
+
+
+def selection_weights(path_lengths: list[float], reverse_prob=False) -> list[float]:
+    """ Turn path lengths into selection weights. Shorter paths weigh more, unless reverse_prob is set.
+        Broken (inf) paths are never picked first, or always preferred with reverse_prob. """
+    finite_lengths = [length for length in path_lengths if length != float('inf')]
+    if not finite_lengths:
+        return [1.0] * len(path_lengths)
+    min_path, max_path = min(finite_lengths), max(finite_lengths)
+    if reverse_prob:
+        return [float(length) if length != float('inf') else float(max_path + min_path) for length in path_lengths]
+    return [float(max_path - length + min_path) if length != float('inf') else 0.0 for length in path_lengths]
+
+
+def roulette_selection(weights: list[float], remain_num: int, excluded: set[int] = frozenset(),
+                       rng=random) -> list[int]:
+    """ Spin roulette remain_num times without replacement, each spin is O(log n). """
+    weights = weights.copy()
+    for path_idx in excluded:
+        weights[path_idx] = 0.0
+    tree = FenwickTree(weights)
+    p_sum = tree.total()
+    positive_left = sum(1 for weight in weights if weight > 0)
+
+    remain_ids = []
+    for spin in range(remain_num):
+        if positive_left == 0:
+            # Only zero weights left, pick the rest uniformly
+            chosen = excluded.union(remain_ids)
+            others = [idx for idx in range(len(weights)) if idx not in chosen]
+            remain_ids.extend(rng.sample(others, min(remain_num - spin, len(others))))
+            break
+        path_idx = tree.find(rng.uniform(0, p_sum))
+        if path_idx >= len(weights) or weights[path_idx] <= 0:
+            # Point fell past the end due to accumulated float error, take the last path still in the wheel
+            path_idx = max(idx for idx, weight in enumerate(weights) if weight > 0)
+        remain_ids.append(path_idx)
+        tree.add(path_idx, -weights[path_idx])
+        p_sum -= weights[path_idx]
+        weights[path_idx] = 0.0
+        positive_left -= 1
+
+    return remain_ids
 
-    min_path = min(path_lengths)
-    min_path_idx = path_lengths.index(min_path)
-    if not reverse_prob:
-        max_path = max(path_lengths)
 
-        def reverse_path_length(path_len):
-            return max_path - path_len + min_path
-        path_lengths = map(reverse_path_length, path_lengths)
+def tournament_selection(weights: list[float], remain_num: int, excluded: set[int] = frozenset(),
+                         tournament_size=3, rng=random) -> list[int]:
+    """ Repeatedly take the best weighted path of a random group of candidates and remove it from the pool. """
+    candidates = [idx for idx in range(len(weights)) if idx not in excluded]
+    remain_ids = []
+    for _ in range(min(remain_num, len(candidates))):
+        group = rng.sample(range(len(candidates)), min(tournament_size, len(candidates)))
+        winner = max(group, key=lambda position: weights[candidates[position]])
+        remain_ids.append(candidates[winner])
+        # Swap remove to keep the pool update O(1)
+        candidates[winner] = candidates[-1]
+        candidates.pop()
+    return remain_ids
 
-    # create a dict for saving the initial indexes of paths after multiple roulette spins
-    path_lengths_dict = {path_idx: path_length for path_idx, path_length in enumerate(path_lengths)}
 
-    if preserve_best:
-        path_lengths_dict.pop(min_path_idx)
-        remain_num -= 1
+def stochastic_universal_selection(weights: list[float], remain_num: int,
+                                   excluded: set[int] = frozenset(), rng=random) -> list[int]:
+    """ Pick paths under remain_num equally spaced pointers in one sweep over cumulative weights.
+        A path can sit under several pointers, the missing picks are made by roulette among the rest. """
+    weights = weights.copy()
+    for path_idx in excluded:
+        weights[path_idx] = 0.0
+    p_sum = sum(weights)
+    if p_sum <= 0 or remain_num < 1:
+        return roulette_selection(weights, remain_num, excluded, rng)
 
+    spacing = p_sum / remain_num
+    pointer = rng.uniform(0, spacing)
     remain_ids = []
-    for spin in range(remain_num):
-        p_sum = sum(path_lengths_dict.values())
-        fixed_point = random.randint(0, p_sum)
-        cumulative_length = 0
-        for path_idx, length in path_lengths_dict.items():
-            cumulative_length += length
-            if fixed_point <= cumulative_length:
-                remain_ids.append(path_idx)
-                path_lengths_dict.pop(path_idx)
-                break
+    cumulative_length = 0.0
+    for path_idx, weight in enumerate(weights):
+        cumulative_length += weight
+        if pointer < cumulative_length:
+            remain_ids.append(path_idx)
+            while pointer < cumulative_length:
+                pointer += spacing
+
+    if len(remain_ids) < remain_num:
+        remain_ids.extend(
+            roulette_selection(weights, remain_num - len(remain_ids), excluded.union(remain_ids), rng)
+        )
+    # Pointers visit paths in index order, shuffle so that crossover pairs stay random
+    rng.shuffle(remain_ids)
+    return remain_ids
+
+
+SELECTION_STRATEGIES = {
+    'roulette': roulette_selection,
+    'tournament': tournament_selection,
+    'sus': stochastic_universal_selection,
+}
+
+
+def selection(path_lengths: list[float], remain_pct=0.5, reverse_prob=False, preserve_best=False,
+              strategy='roulette', rng=random) -> list[int]:
+    """ Randomly pick selected percent of paths of the population based on their fitness.
+        Strategy is one of SELECTION_STRATEGIES keys. Return ids of selected paths. """
+    remain_num = round(len(path_lengths) * remain_pct)
+
+    if remain_num < 1:
+        return []
 
-    if preserve_best:
-        remain_ids.append(min_path_idx)
+    min_path_idx = path_lengths.index(min(path_lengths))
+    weights = selection_weights(path_lengths, reverse_prob)
 
+    if not preserve_best:
+        return SELECTION_STRATEGIES[strategy](weights, remain_num, rng=rng)
+
+    remain_ids = SELECTION_STRATEGIES[strategy](weights, remain_num - 1, {min_path_idx}, rng=rng)
+    remain_ids.append(min_path_idx)
     return remain_ids
 
 
@@ -169,21 +597,130 @@ def selection(path_lengths: list[float], remain_pct=0.5, reverse_prob=False, pre
 #     return list(remain_ids)
 
 
-def crossover(path1: list[int], path2: list[int]) -> tuple[list[int], list[int]]:
-    """ Randomly pick common node for the paths, then cut them and connect pieces.
+def node_positions(path: list[int]) -> dict[int, int]:
+    """ Map every node of the path to its first position in the path. """
+    positions = {}
+    for idx, node in enumerate(path):
+        positions.setdefault(node, idx)
+    return positions
+
+
+def common_points(path1: list[int], path2: list[int]) -> list[tuple[int, int]]:
+    """ Return positions in both paths of the nodes path1[1:-2] which are also in path2, in path1 order.
+        Uses position index of both paths, so it is O(L) instead of O(L^2) list membership checks. """
+    positions1, positions2 = node_positions(path1), node_positions(path2)
+    return [(positions1[node], positions2[node]) for node in path1[1:-2] if node in positions2]
+
+
+def crossover_points(path1: list[int], path2: list[int], rng=random) -> tuple[int, int] | None:
+    """ Randomly pick common node for the paths. Return its positions in both paths, or None if there is none. """
+    points = common_points(path1, path2)
+    if len(points) < 1:
+        return None
+
+    return rng.choice(points)
+
+
+def ordered_points(points: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """ Keep common points which go forward in both paths, so the paths can be cut at all of them at once. """
+    ordered = []
+    for id1, id2 in points:
+        if not ordered or (id1 > ordered[-1][0] and id2 > ordered[-1][1]):
+            ordered.append((id1, id2))
+    return ordered
+
+
+def single_point_cuts(path1: list[int], path2: list[int], rng=random) -> list[tuple[int, int]]:
+    """ Cut the paths at one random common node. """
+    points = crossover_points(path1, path2, rng)
+    return [points] if points is not None else []
+
+
+def multi_point_cuts(path1: list[int], path2: list[int], rng=random, points_num=2) -> list[tuple[int, int]]:
+    """ Cut the paths at up to points_num random common nodes. """
+    points = ordered_points(common_points(path1, path2))
+    return sorted(rng.sample(points, min(points_num, len(points))))
+
+
+def all_common_cuts(path1: list[int], path2: list[int], rng=random) -> list[tuple[int, int]]:
+    """ Consider every common node and cut at each of them with probability 0.5, so every segment between
+        common nodes comes from a random parent. """
+    return [point for point in ordered_points(common_points(path1, path2)) if rng.random() < 0.5]
+
+
+CROSSOVER_STRATEGIES = {
+    'single': single_point_cuts,
+    'multi_point': multi_point_cuts,
+    'all_common': all_common_cuts,
+}
+
+
+def splice(path1: list[int], path2: list[int], cuts: list[tuple[int, int]]) -> tuple[list[int], list[int]]:
+    """ Cut both paths at the cuts (positions of a common node in both paths) and connect pieces,
+        children switch to the other parent at every cut. """
+    children = ([], [])
+    parents = (path1, path2)
+    starts = (0, 0)
+    for cut_idx, ends in enumerate(cuts + [(len(path1), len(path2))]):
+        for child_idx, child in enumerate(children):
+            parent_idx = (child_idx + cut_idx) % 2
+            child.extend(parents[parent_idx][starts[parent_idx]:ends[parent_idx]])
+        starts = ends
+    return children
+
+
+def splice_with_costs(
+        path1: list[int], costs1: list[float], path2: list[int], costs2: list[float], cuts: list[tuple[int, int]]
+) -> tuple[list[int], list[float], list[int], list[float]]:
+    """ splice() which also returns prefix costs of the children. Every piece keeps costs of its parent
+        shifted by the child cost at the cut, so no edge weight is looked up. Parents costs should be finite. """
+    parents = ((path1, costs1), (path2, costs2))
+    result = []
+    for child_idx in range(2):
+        child, child_costs = [], []
+        starts = (0, 0)
+        cut_cost = 0
+        for cut_idx, ends in enumerate(cuts + [(len(path1), len(path2))]):
+            parent_idx = (child_idx + cut_idx) % 2
+            path, costs = parents[parent_idx]
+            start, end = starts[parent_idx], ends[parent_idx]
+            shift = cut_cost - costs[start]
+            child.extend(path[start:end])
+            child_costs.extend(cost + shift for cost in costs[start:end])
+            if end < len(path):
+                cut_cost = costs[end] + shift
+            starts = ends
+        result.extend((child, child_costs))
+    return tuple(result)
+
+
+def crossover(path1: list[int], path2: list[int], rng=random, strategy='single') -> tuple[list[int], list[int]]:
+    """ Pick common nodes for the paths with one of CROSSOVER_STRATEGIES, then cut them and connect pieces.
         Supports only simple paths. Return two new children. """
 
-    common_nodes = [node for node in path1[1:-2] if node in path2]
-    if len(common_nodes) < 1:
+    cuts = CROSSOVER_STRATEGIES[strategy](path1, path2, rng)
+    if not cuts:
         return path1, path2
 
-    node = random.choice(common_nodes)
-    node_id_in_path1 = path1.index(node)
-    node_id_in_path2 = path2.index(node)
+    return splice(path1, path2, cuts)
+
+
+def crossover_with_costs(
+        path1: list[int], costs1: list[float], path2: list[int], costs2: list[float], graph: Graph, rng=random,
+        strategy='single'
+) -> tuple[list[int], list[float], list[int], list[float]]:
+    """ Crossover which also returns prefix costs of the children. A child is made of pieces of the parents,
+        so its costs are shifted parents costs and no edge weight is looked up. """
+    cuts = CROSSOVER_STRATEGIES[strategy](path1, path2, rng)
+    if not cuts:
+        return path1, costs1, path2, costs2
+
+    if costs1[-1] == float('inf') or costs2[-1] == float('inf'):
+        # shifting inf costs is undefined, broken parents are rare, so score children from scratch
+        child1, child2 = splice(path1, path2, cuts)
+        return child1, prefix_costs(child1, graph), child2, prefix_costs(child2, graph)
 
-    child1 = path1[:node_id_in_path1] + path2[node_id_in_path2:]
-    child2 = path2[:node_id_in_path2] + path1[node_id_in_path1:]
-    return child1, child2
+    return splice_with_costs(path1, costs1, path2, costs2, cuts)
 
 
 def crossover_all(parents: list[list[int]]) -> list[list[int]]:
@@ -204,79 +741,188 @@ def crossover_all(parents: list[list[int]]) -> list[list[int]]:
     return children
 
 
-def mutation(path: list[int], sub_graph_adj_lists: dict[int, list[int]]) -> list[int]:
-    """ Randomly pick node and check if possible to replace the node with a random link.
-        Replace if possible and return mutated path, if not return original path. """
-    if len(path) < 3:
-        return path
+def pick_bypass(bypasses: list[int], replaced_node: int, rng=random) -> int | None:
+    """ Pick random bypass other than the replaced node in O(1), or None if there is no other bypass. """
+    if not bypasses or (len(bypasses) == 1 and bypasses[0] == replaced_node):
+        return None
 
-    node_id = random.choice(range(len(path) - 2))
-    current = path[node_id]
-    next_node = path[node_id + 1]
-    after_next = path[node_id + 2]
+    # bypasses are distinct, so every draw is another node with probability of at least 1/2
+    new_node = rng.choice(bypasses)
+    while new_node == replaced_node:
+        new_node = rng.choice(bypasses)
+    return new_node
 
-    currents_links = sub_graph_adj_lists[current].copy()
-    currents_links.remove(next_node)
 
-    analog_links = []
-    for link in currents_links:
-        if after_next in sub_graph_adj_lists[link]:
-            analog_links.append(link)
+def node_mutation_point(path: list[int], bypass_index: BypassIndex, rng=random
+                        ) -> tuple[int, int, int] | None:
+    """ Randomly pick node and look up another node which links its neighbours in the path.
+        Return (start, end, new node) meaning that path[start + 1:end] is replaced by the new node,
+        or None if the node can not be replaced. """
+    if len(path) < 3:
+        return None
 
-    if analog_links:
-        path[node_id + 1] = random.choice(analog_links)
-        return path
+    node_id = rng.choice(range(len(path) - 2))
+    new_node = pick_bypass(bypass_index.get((path[node_id], path[node_id + 2])), path[node_id + 1], rng)
+    if new_node is None:
+        return None
+    return node_id, node_id + 2, new_node
 
-    return path
 
+def segment_mutation_point(path: list[int], bypass_index: BypassIndex, rng=random,
+                           max_span=4) -> tuple[int, int, int] | None:
+    """ Randomly pick segment of two to max_span hops and look up a two hop bypass between its ends,
+        so a longer detour is replaced at once. Return (start, end, new node) meaning that path[start + 1:end]
+        is replaced by the new node, or None if the segment can not be replaced. """
+    if len(path) < 3:
+        return None
+
+    start = rng.choice(range(len(path) - 2))
+    end = rng.randint(start + 2, min(start + max_span, len(path) - 1))
+    # two hop segment has its middle node among bypasses
+    replaced_node = path[start + 1] if end == start + 2 else None
+    new_node = pick_bypass(bypass_index.get((path[start], path[end])), replaced_node, rng)
+    if new_node is None:
+        return None
+    return start, end, new_node
+
+
+MUTATION_STRATEGIES = {
+    'node': node_mutation_point,
+    'segment': segment_mutation_point,
+}
+
+
+def mutation(path: list[int], bypass_index: BypassIndex, rng=random,
+             strategy='node') -> list[int]:
+    """ Pick part of the path with one of MUTATION_STRATEGIES and replace it with a bypass in place if possible.
+        Return mutated path, or original path if nothing can be replaced. """
+    point = MUTATION_STRATEGIES[strategy](path, bypass_index, rng)
+    if point is not None:
+        start, end, new_node = point
+        path[start + 1:end] = [new_node]
+    return path
 
-def genetic(graph_data: list[list[int]], source: int, destination: int,
-            population_size=4, max_generations_num=6, crossover_prob=0.6,
-            mutation_prob=0.1, survival_pct=0.5, max_generations_unimproved=2,
-            ) -> list[int]:
 
-    sub_graph_nodes = reverse_dfs(destination, graph_data)
-    sub_graph_adj_lists = create_sub_graph_adj_lists(sub_graph_nodes, graph_data)
-    population = generate_initial_population(
-        source, destination, population_size, sub_graph_nodes, sub_graph_adj_lists
+def mutation_with_costs(
+        path: list[int], costs: list[float], bypass_index: BypassIndex, graph: Graph,
+        rng=random, strategy='node'
+) -> tuple[list[int], list[float]]:
+    """ Mutation which also returns prefix costs of the mutated path, updated by the two new links only. """
+    point = MUTATION_STRATEGIES[strategy](path, bypass_index, rng)
+    if point is None:
+        return path, costs
+
+    start, end, new_node = point
+    link_in, link_out = graph.weight(path[start], new_node), graph.weight(new_node, path[end])
+    path[start + 1:end] = [new_node]
+    if costs[-1] == float('inf') or link_in == 0 or link_out == 0:
+        return path, prefix_costs(path, graph)
+
+    new_cost = costs[start] + link_in
+    delta = new_cost + link_out - costs[end]
+    return path, costs[:start + 1] + [new_cost] + [cost + delta for cost in costs[end:]]
+
+
+def path_lengths_of(path_costs: list[list[float]]) -> list[float]:
+    """ Path costs are the last prefix costs. """
+    return [costs[-1] for costs in path_costs]
+
+
+def crossover_pairs(pairs: list[tuple[int, int]], population: list[list[int]], path_costs: list[list[float]],
+                    graph: Graph, rng=random, strategy='single') -> None:
+    """ Replace every pair of parents with their children and the children costs in place. """
+    for id1, id2 in pairs:
+        population[id1], path_costs[id1], population[id2], path_costs[id2] = crossover_with_costs(
+            population[id1], path_costs[id1], population[id2], path_costs[id2], graph, rng, strategy
+        )
+
+
+def mutate_paths(mutation_ids: list[int], population: list[list[int]], path_costs: list[list[float]],
+                 bypass_index: BypassIndex, graph: Graph, rng=random, strategy='node') -> None:
+    """ Mutate every path of mutation_ids and update its costs in place. """
+    for idx in mutation_ids:
+        population[idx], path_costs[idx] = mutation_with_costs(
+            population[idx], path_costs[idx], bypass_index, graph, rng, strategy
+        )
+
+
+def evolve_generation(
+        graph: Graph, population: list[list[int]], path_costs: list[list[float]],
+        bypass_index: BypassIndex, crossover_prob=0.6, mutation_prob=0.1, survival_pct=0.5,
+        selection_strategy='roulette', rng=random, crossover_strategy='single', mutation_strategy='node',
+        stats: GeneticStats = None, crossover_executor=crossover_pairs, mutation_executor=mutate_paths,
+) -> tuple[list[list[int]], list[list[float]]] | None:
+    """ Run crossover, mutation and survivors selection once. Crossover and mutation update population and
+        its prefix costs in place. Return survivors with their costs, or None if only the best path would survive.
+        Children costs are derived from parents costs, so every changed path counts as a fitness evaluation.
+        crossover_executor and mutation_executor apply the operators to the selected paths, they take
+        the arguments of crossover_pairs and mutate_paths, e.g. to spread the work over threads. """
+    if stats is not None:
+        # operators replace costs of the changed paths, so they are counted by identity against a copy
+        costs_before = path_costs.copy()
+        phase_start = time.perf_counter()
+    # crossover selection
+    parents_ids = selection(path_lengths_of(path_costs), crossover_prob, strategy=selection_strategy, rng=rng)
+    # when some path has no pair, skip it
+    if len(parents_ids) % 2 == 1:
+        parents_ids.pop()
+    # crossover through the population, children costs come from parents costs
+    pairs = list(zip(parents_ids[::2], parents_ids[1::2]))
+    crossover_executor(pairs, population, path_costs, graph, rng, crossover_strategy)
+    if stats is not None:
+        crossovers = sum(path_costs[id1] is not costs_before[id1] for id1, _ in pairs)
+        phase_start = stats.record(
+            'crossover', phase_start, crossover_calls=len(pairs), crossovers=crossovers,
+            fitness_evaluations=2 * crossovers
+        )
+        costs_before = path_costs.copy()
+
+    # mutation selection, reverse probabilities to choose the worst paths for mutation first
+    mutation_ids = selection(
+        path_lengths_of(path_costs), mutation_prob, reverse_prob=True, strategy=selection_strategy, rng=rng
+    )
+    mutation_executor(mutation_ids, population, path_costs, bypass_index, graph, rng, mutation_strategy)
+    if stats is not None:
+        mutations = sum(path_costs[idx] is not costs_before[idx] for idx in mutation_ids)
+        phase_start = stats.record(
+            'mutation', phase_start, mutation_calls=len(mutation_ids), mutations=mutations,
+            fitness_evaluations=mutations
+        )
+
+    # survivors selection
+    survivors_ids = selection(
+        path_lengths_of(path_costs), survival_pct, preserve_best=True, strategy=selection_strategy, rng=rng
     )
-    path_lengths = fitness_all(population, graph_data)
+    if stats is not None:
+        stats.record('selection', phase_start)
+    if len(survivors_ids) <= 1:
+        return None
+    # best fitted path remain, others die
+    return [population[idx] for idx in survivors_ids], [path_costs[idx] for idx in survivors_ids]
+
+
+def run_generations(population, evolve, path_lengths, max_generations_num=6, max_generations_unimproved=2,
+                    stats: GeneticStats = None):
+    """ Evolve the population until max_generations_num generations pass, the best path length does not improve
+        for max_generations_unimproved generations or only the best path would survive. evolve(population) runs
+        one generation and returns the survivors, or None if only the best path would survive.
+        path_lengths(population) returns the path lengths of the survivors. Return the last survivors. """
     generations_unimproved = 0
     last_best_length = float('inf')
+    termination = 'max_generations'
 
     for generation in range(max_generations_num):
-        # crossover selection
-        parents_ids = selection(path_lengths, crossover_prob)
-        # when some path has no pair, skip it
-        if len(parents_ids) % 2 == 1:
-            parents_ids.pop()
-        # crossover through the population
-        for idx in range(0, len(parents_ids), 2):
-            parent1, parent2 = population[parents_ids[idx]], population[parents_ids[idx+1]]
-            child1, child2 = crossover(parent1, parent2)
-            population[parents_ids[idx]], population[parents_ids[idx+1]] = child1, child2
-            # update new path fitness
-            path_lengths[parents_ids[idx]] = fitness(child1, graph_data)
-            path_lengths[parents_ids[idx + 1]] = fitness(child2, graph_data)
-
-        # mutation selection, reverse probabilities to choose the worst paths for mutation first
-        mutation_ids = selection(path_lengths, mutation_prob, reverse_prob=True)
-
-        for idx in mutation_ids:
-            population[idx] = mutation(population[idx], sub_graph_adj_lists)
-            # update path length after mutation
-            path_lengths[idx] = fitness(population[idx], graph_data)
-
-        # survivors selection
-        survivors_ids = selection(path_lengths, survival_pct, preserve_best=True)
+        survivors = evolve(population)
         # if there are no survivors (one preserved), stop on current generation
-        if len(survivors_ids) <= 1:
+        if survivors is None:
+            termination = 'no_survivors'
             break
-        # best fitted path remain, others die
-        population = [population[idx] for idx in survivors_ids]
-        path_lengths = [path_lengths[idx] for idx in survivors_ids]
+        population = survivors
+        survivors_lengths = path_lengths(population)
+        if stats is not None:
+            stats.generation_done(generation, survivors_lengths)
 
-        current_best_length = min(path_lengths)
+        current_best_length = min(survivors_lengths)
         if current_best_length >= last_best_length:
             generations_unimproved += 1
         else:
@@ -284,9 +930,57 @@ def genetic(graph_data: list[list[int]], source: int, destination: int,
         last_best_length = current_best_length
 
         if generations_unimproved >= max_generations_unimproved:
-            # print(f"Termination because there has been no improvement for {generations_unimproved} generations.")
+            termination = 'unimproved'
             break
 
-    # print('result paths =', population)
-    best_path_id = path_lengths.index(min(path_lengths))
-    return population[best_path_id]
+    if stats is not None:
+        stats.terminate(termination)
+    return population
+
+
+def best_path(population: list[list[int]], path_costs: list[list[float]]) -> list[int]:
+    path_lengths = path_lengths_of(path_costs)
+    return population[path_lengths.index(min(path_lengths))]
+
+
+def genetic(graph: Graph, source: int, destination: int,
+            population_size=4, max_generations_num=6, crossover_prob=0.6,
+            mutation_prob=0.1, survival_pct=0.5, max_generations_unimproved=2,
+            sub_graph_cache: SubGraphCache = None, population_costs=prefix_costs_all, selection_strategy='roulette',
+            rng=random, seed_paths: list[list[int]] = (), seed_ratio=0.25, crossover_strategy='single',
+            mutation_strategy='node', stats: GeneticStats = None,
+            ) -> list[int]:
+    """ Search for the shortest path from source to destination with genetic algorithm.
+        population_costs calculates prefix costs of the initial population, e.g. batch_fitness.prefix_costs_all,
+        afterwards children costs are derived from their parents costs.
+        selection_strategy is one of SELECTION_STRATEGIES keys. rng is random module or random.Random instance.
+        seed_paths warm start the search, they fill up to seed_ratio of the initial population.
+        crossover_strategy and mutation_strategy are CROSSOVER_STRATEGIES and MUTATION_STRATEGIES keys.
+        stats is GeneticStats instance which collects timings and counters of the run. """
+
+    if stats is not None:
+        phase_start = time.perf_counter()
+    if sub_graph_cache is None:
+        sub_graph_cache = get_sub_graph_cache(graph)
+    sub_graph_nodes, sub_graph_adj_lists = sub_graph_cache.get(graph, destination, stats)
+    bypass_index = sub_graph_cache.get_bypass_index(graph)
+    if stats is not None:
+        phase_start = stats.record('setup', phase_start)
+    population = generate_initial_population(
+        source, destination, population_size, sub_graph_nodes, sub_graph_adj_lists, rng, seed_paths, seed_ratio
+    )
+    if stats is not None:
+        phase_start = stats.record('initialization', phase_start)
+    path_costs = population_costs(population, graph)
+    if stats is not None:
+        stats.record('fitness', phase_start, fitness_evaluations=len(population))
+
+    population, path_costs = run_generations(
+        (population, path_costs),
+        lambda survivors: evolve_generation(
+            graph, *survivors, bypass_index, crossover_prob, mutation_prob, survival_pct, selection_strategy, rng,
+            crossover_strategy, mutation_strategy, stats
+        ),
+        lambda survivors: path_lengths_of(survivors[1]), max_generations_num, max_generations_unimproved, stats
+    )
+    return best_path(population, path_costs)
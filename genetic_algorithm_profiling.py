@@ -8,19 +8,20 @@ edges = [(0, 2, 8), (0, 3, 2), (0, 4, 7), (0, 5, 4), (2, 1, 2), (3, 6, 6), (4, 7
 num_nodes = 13
 source, destination = 0, 10
 
-graph = python_graph.Graph(num_nodes, edges, is_directed=True)
+graph = python_graph.Graph(num_nodes, [(n1, n2, {'weight': weight}) for n1, n2, weight in edges], is_directed=True)
 
 # --- SETUP ---
-sub_nodes = reverse_dfs(destination, graph.data)
-sub_adj_lists = create_sub_graph_adj_lists(sub_nodes, graph.data)
+sub_nodes = reverse_dfs(destination, graph)
+sub_adj_lists = create_sub_graph_adj_lists(sub_nodes, graph)
 population = generate_initial_population(source, destination, 100, sub_nodes, sub_adj_lists)
-path_lengths = fitness_all(population, graph.data)
+path_lengths = fitness_all(population, graph)
 # -------------
-start = time.perf_counter()
-for _ in range(1000):
-    selected_ids = selection(path_lengths, preserve_best=True)
-end = time.perf_counter()
-print(f"Result time = {end-start:.2f} sec")
+for strategy in SELECTION_STRATEGIES:
+    start = time.perf_counter()
+    for _ in range(1000):
+        selected_ids = selection(path_lengths, preserve_best=True, strategy=strategy)
+    end = time.perf_counter()
+    print(f"{strategy} result time = {end-start:.2f} sec")
 # -------------
 # start = time.perf_counter()
 # for _ in range(1000):
@@ -29,9 +30,10 @@ print(f"Result time = {end-start:.2f} sec")
 # print(f"Result time = {end-start:.2f} sec")
 # ------------
 path_lengths = [2, 3, 4, 5, 6, 7]
-frequencies = [0, 0, 0, 0, 0, 0]
-for i in range(10000):
-    selected_ids = selection(path_lengths, preserve_best=True)
-    for idx in selected_ids:
-        frequencies[idx] += 1
-print(frequencies)
+for strategy in SELECTION_STRATEGIES:
+    frequencies = [0, 0, 0, 0, 0, 0]
+    for i in range(10000):
+        selected_ids = selection(path_lengths, preserve_best=True, strategy=strategy)
+        for idx in selected_ids:
+            frequencies[idx] += 1
+    print(strategy, frequencies)
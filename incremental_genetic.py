@@ -0,0 +1,180 @@
+import random
+from genetic_algorithm import (
+    evolve_generation, generate_initial_population, get_sub_graph_cache, path_lengths_of, prefix_costs, prefix_costs_all,
+    randomized_dfs
+)
+from python_graph import Graph
+
+
+class IncrementalGenetic():
+    """ Long-lived genetic solver which keeps a population for every routed (source, destination) pair.
+        On link changes it repairs or rescores only paths that use the changed link and runs
+        a few generations to converge again, instead of solving the pair from scratch. """
+
+    def __init__(self, graph: Graph, population_size: int, seed=None):
+        self.graph = graph
+        self.population_size = population_size
+        self.sub_graph_cache = get_sub_graph_cache(graph)
+        self.rng = random.Random(seed)
+        self.populations: dict[tuple[int, int], tuple[list[list[int]], list[list[float]]]] = {}
+
+        self.max_generations_num = 6
+        self.repair_generations_num = 2
+        self.crossover_prob = 0.6
+        self.mutation_prob = 0.1
+        self.survival_pct = 0.5
+        self.selection_strategy = 'roulette'
+        self.crossover_strategy = 'single'
+        self.mutation_strategy = 'node'
+        self.population_costs = prefix_costs_all
+
+    def route(self, source: int, destination: int) -> list[int]:
+        """ Return best known path of the pair, solving the pair first if it has not been routed yet. """
+        key = (source, destination)
+        if key not in self.populations:
+            sub_graph_nodes, sub_graph_adj_lists = self._sub_graph(source, destination)
+            population = generate_initial_population(
+                source, destination, self.population_size, sub_graph_nodes, sub_graph_adj_lists, self.rng
+            )
+            self.populations[key] = (population, self.population_costs(population, self.graph))
+            self._converge(key, self.max_generations_num)
+
+        population, path_costs = self.populations[key]
+        path_lengths = path_lengths_of(path_costs)
+        return population[path_lengths.index(min(path_lengths))]
+
+    def forget(self, source: int, destination: int) -> None:
+        self.populations.pop((source, destination), None)
+
+    def link_down(self, n1: int, n2: int) -> None:
+        """ Remove the link and reroute broken paths around it. """
+        self.graph.remove_edge((n1, n2))
+        for key in list(self.populations):
+            population, path_costs = self.populations[key]
+            broken_ids = [idx for idx, path in enumerate(population) if self._uses_link(path, n1, n2)]
+            if not broken_ids:
+                continue
+
+            source, destination = key
+            sub_graph_nodes, sub_graph_adj_lists = self.sub_graph_cache.get(self.graph, destination)
+            if source not in sub_graph_adj_lists:
+                # destination is not reachable anymore, the pair will be solved from scratch by the next route call
+                del self.populations[key]
+                continue
+            for idx in broken_ids:
+                population[idx] = self._repair(population[idx], sub_graph_nodes, sub_graph_adj_lists)
+                # rescore only repaired paths
+                if population[idx] is not None:
+                    path_costs[idx] = prefix_costs(population[idx], self.graph)
+            # paths that could not be repaired die and new random paths take their place
+            kept_ids = [idx for idx, path in enumerate(population) if path is not None]
+            population = [population[idx] for idx in kept_ids]
+            path_costs = [path_costs[idx] for idx in kept_ids]
+            self._refill(key, population, path_costs)
+            self.populations[key] = (population, path_costs)
+            self._converge(key, self.repair_generations_num)
+
+    def link_up(self, edge: tuple) -> None:
+        """ Add the link (or restore its weight) and let populations that can use it converge again. """
+        self.graph.add_edge(edge)
+        n1, n2 = edge[0], edge[1]
+        for key in list(self.populations):
+            source, destination = key
+            population, path_costs = self.populations[key]
+            # rescore paths which already use the link, e.g. after a weight change
+            for idx, path in enumerate(population):
+                if self._uses_link(path, n1, n2):
+                    path_costs[idx] = prefix_costs(path, self.graph)
+            _, sub_graph_adj_lists = self.sub_graph_cache.get(self.graph, destination)
+            if n1 in sub_graph_adj_lists or n2 in sub_graph_adj_lists:
+                self._converge(key, self.repair_generations_num)
+
+    def set_weight(self, n1: int, n2: int, weight: int | float) -> None:
+        """ Change weight of an existing link. """
+        self.link_up((n1, n2, {'weight': weight}))
+
+    def _sub_graph(self, source: int, destination: int) -> tuple[list[int], dict[int, list[int]]]:
+        sub_graph_nodes, sub_graph_adj_lists = self.sub_graph_cache.get(self.graph, destination)
+        if source not in sub_graph_adj_lists:
+            raise Exception(f'Destination {destination} is unreachable from {source}.')
+        return sub_graph_nodes, sub_graph_adj_lists
+
+    def _uses_link(self, path: list[int], n1: int, n2: int) -> bool:
+        for idx in range(len(path) - 1):
+            hop = (path[idx], path[idx + 1])
+            if hop == (n1, n2) or (not self.graph.is_directed and hop == (n2, n1)):
+                return True
+        return False
+
+    def _repair(self, path: list[int], sub_graph_nodes: list[int], sub_graph_adj_lists: dict[int, list[int]]
+                ) -> list[int] | None:
+        """ Replace every missing hop of the path with a random detour between its ends which avoids the rest
+            of the path. If there is no such detour, route from the start of the hop to destination.
+            Return None if the path can not be repaired. """
+        weight = self.graph.weight
+        idx = 0
+        while idx < len(path) - 1:
+            if weight(path[idx], path[idx + 1]) > 0:
+                idx += 1
+                continue
+            prefix, suffix = path[:idx], path[idx + 2:]
+            detour = randomized_dfs(
+                path[idx], path[idx + 1], sub_graph_nodes, sub_graph_adj_lists, self.rng, set(prefix + suffix)
+            )
+            if detour:
+                path = prefix + detour + suffix
+            else:
+                detour = randomized_dfs(
+                    path[idx], path[-1], sub_graph_nodes, sub_graph_adj_lists, self.rng, set(prefix)
+                )
+                if not detour:
+                    return None
+                path = prefix + detour
+            idx += 1
+        return path
+
+    def _converge(self, key: tuple[int, int], generations_num: int) -> None:
+        """ Evolve a copy of the population and keep the best distinct paths of both the evolved and the original
+            population, so the stored population does not shrink with every survivors selection. If there are
+            fewer distinct paths than population_size, new random paths fill the rest. """
+        population, path_costs = self.populations[key]
+        # raises if the destination is not reachable anymore
+        self._sub_graph(*key)
+        bypass_index = self.sub_graph_cache.get_bypass_index(self.graph)
+        evolved, evolved_costs = [path.copy() for path in population], path_costs.copy()
+        for generation in range(generations_num):
+            survivors = evolve_generation(
+                self.graph, evolved, evolved_costs, bypass_index, self.crossover_prob, self.mutation_prob,
+                self.survival_pct, self.selection_strategy, self.rng, self.crossover_strategy, self.mutation_strategy
+            )
+            if survivors is None:
+                break
+            evolved, evolved_costs = survivors
+
+        seen = set()
+        merged, merged_costs = [], []
+        for costs, path in sorted(zip(evolved_costs + path_costs, evolved + population),
+                                  key=lambda candidate: candidate[0][-1]):
+            if costs[-1] == float('inf') or tuple(path) in seen:
+                continue
+            seen.add(tuple(path))
+            merged.append(path)
+            merged_costs.append(costs)
+            if len(merged) == self.population_size:
+                break
+        self._refill(key, merged, merged_costs)
+        self.populations[key] = (merged, merged_costs)
+
+    def _refill(self, key: tuple[int, int], population: list[list[int]], path_costs: list[list[float]]) -> None:
+        """ Add new random paths of the pair up to population_size, so dead and duplicate paths do not shrink
+            the population with every link change. """
+        missing = self.population_size - len(population)
+        if missing <= 0:
+            return
+        source, destination = key
+        sub_graph_nodes, sub_graph_adj_lists = self._sub_graph(source, destination)
+        new_paths = generate_initial_population(
+            source, destination, missing, sub_graph_nodes, sub_graph_adj_lists, self.rng
+        )
+        population.extend(new_paths)
+        path_costs.extend(self.population_costs(new_paths, self.graph))
@@ -0,0 +1,222 @@
+import multiprocessing
+import random
+from multiprocessing.connection import Connection
+from genetic_algorithm import (
+    evolve_generation, generate_initial_population, get_sub_graph_cache, path_lengths_of, prefix_costs_all
+)
+from python_graph import Graph
+
+
+def ring_topology(island: int, islands_num: int) -> list[int]:
+    """ Every island sends migrants to the next one. """
+    return [(island + 1) % islands_num] if islands_num > 1 else []
+
+
+def complete_topology(island: int, islands_num: int) -> list[int]:
+    """ Every island sends migrants to all other islands. """
+    return [other for other in range(islands_num) if other != island]
+
+
+MIGRATION_TOPOLOGIES = {
+    'ring': ring_topology,
+    'complete': complete_topology,
+}
+
+
+class IslandGenetic():
+    """ Island model of the genetic algorithm. The population is split into sub populations (islands) which evolve
+        independently in worker processes and exchange their best paths every migration_interval generations
+        (one epoch). Every worker process holds the graph and its islands for the whole run, so only migrants
+        and the best paths travel between the processes. The search stops after max_epochs_unimproved epochs
+        without a better path. Every island draws from its own random.Random seeded from the master seed,
+        so results only depend on the seed and the number of islands. """
+
+    def __init__(self, graph: Graph, population_size: int, cpus=2, islands_num=None, seed=None):
+        self.graph = graph
+        self.population_size = population_size
+        self.cpus = cpus
+        self.islands_num = islands_num or cpus
+        self.workers: list[tuple[multiprocessing.Process, Connection]] = []
+        self._workers_graph_version = None
+        self.rng = random.Random(seed)
+
+        self.max_generations_num = 6
+        self.crossover_prob = 0.6
+        self.mutation_prob = 0.1
+        self.survival_pct = 0.5
+        self.max_epochs_unimproved = 2
+        self.selection_strategy = 'roulette'
+        self.crossover_strategy = 'single'
+        self.mutation_strategy = 'node'
+        self.population_costs = prefix_costs_all
+
+        self.migration_interval = 2
+        self.migration_size = 1
+        self.migration_topology = 'ring'
+
+    def genetic(self, source: int, destination: int) -> list[int]:
+        workers = self._get_workers()
+        settings = {
+            'crossover_prob': self.crossover_prob,
+            'mutation_prob': self.mutation_prob,
+            'survival_pct': self.survival_pct,
+            'selection_strategy': self.selection_strategy,
+            'crossover_strategy': self.crossover_strategy,
+            'mutation_strategy': self.mutation_strategy,
+        }
+        islands_num = min(self.islands_num, self.population_size)
+        sizes = [self.population_size // islands_num + (island < self.population_size % islands_num)
+                 for island in range(islands_num)]
+        seeds = [self.rng.getrandbits(64) for _ in range(islands_num)]
+        # island i lives in the worker i % len(workers)
+        owned_islands = [range(worker, islands_num, len(workers)) for worker in range(len(workers))]
+        self._exchange([
+            ('start', source, destination, {island: (sizes[island], seeds[island]) for island in worker_islands},
+             self.population_costs, settings, self.migration_size)
+            for worker_islands in owned_islands
+        ])
+
+        topology = MIGRATION_TOPOLOGIES[self.migration_topology]
+        incoming: dict[int, list[tuple[list[int], list[float]]]] = {island: [] for island in range(islands_num)}
+        islands: dict[int, tuple[bool, list[int], float, list]] = {}
+        epochs_unimproved = 0
+        last_best_length = float('inf')
+
+        generation = 0
+        while generation < self.max_generations_num:
+            epoch_generations = min(self.migration_interval, self.max_generations_num - generation)
+            for replies in self._exchange([
+                ('evolve', epoch_generations, {island: incoming[island] for island in worker_islands})
+                for worker_islands in owned_islands
+            ]):
+                islands.update(replies)
+            generation += epoch_generations
+            if all(finished for finished, _, _, _ in islands.values()):
+                break
+
+            # migrants of every island reach its neighbours in the next epoch
+            incoming = {island: [] for island in range(islands_num)}
+            for island, (_, _, _, migrants) in islands.items():
+                for neighbour in topology(island, islands_num):
+                    if not islands[neighbour][0]:
+                        incoming[neighbour].extend(migrants)
+
+            current_best_length = min(best_length for _, _, best_length, _ in islands.values())
+            if current_best_length >= last_best_length:
+                epochs_unimproved += 1
+            else:
+                epochs_unimproved = 0
+            last_best_length = current_best_length
+
+            if epochs_unimproved >= self.max_epochs_unimproved:
+                break
+
+        _, best_path, _, _ = min(islands.values(), key=lambda island: island[2])
+        return best_path
+
+    def _exchange(self, messages: list[tuple]) -> list:
+        """ Send one message to every worker and return their replies. All replies are received before
+            an exception of a worker is raised, so the workers stay in step with the next messages. """
+        for (_, connection), message in zip(self._get_workers(), messages):
+            connection.send(message)
+        replies = [connection.recv() for _, connection in self.workers]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
+
+    def _get_workers(self) -> list[tuple[multiprocessing.Process, Connection]]:
+        # Workers hold their own copy of the graph, so restart them after the graph has changed
+        if self.workers and self._workers_graph_version != self.graph.version:
+            self.close()
+        if not self.workers:
+            for worker in range(min(self.cpus, self.islands_num)):
+                connection, worker_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=island_worker, args=(worker_connection, self.graph),
+                                                  daemon=True)
+                process.start()
+                worker_connection.close()
+                self.workers.append((process, connection))
+            self._workers_graph_version = self.graph.version
+        return self.workers
+
+    def close(self) -> None:
+        for process, connection in self.workers:
+            connection.send(None)
+            connection.close()
+            process.join()
+        self.workers = []
+
+
+def island_worker(connection: Connection, graph: Graph) -> None:
+    """ Serve the islands of one worker process until None is received. Every message gets one reply,
+        the exception raised by the message if any. """
+    sub_graph_cache = get_sub_graph_cache(graph)
+    islands: dict[int, Island] = {}
+    while True:
+        message = connection.recv()
+        if message is None:
+            return
+        try:
+            if message[0] == 'start':
+                _, source, destination, islands_settings, population_costs, settings, migration_size = message
+                sub_graph_nodes, sub_graph_adj_lists = sub_graph_cache.get(graph, destination)
+                bypass_index = sub_graph_cache.get_bypass_index(graph)
+                islands = {}
+                for island, (population_size, seed) in islands_settings.items():
+                    rng = random.Random(seed)
+                    population = generate_initial_population(
+                        source, destination, population_size, sub_graph_nodes, sub_graph_adj_lists, rng
+                    )
+                    islands[island] = Island(
+                        graph, population, population_costs(population, graph), bypass_index, settings,
+                        migration_size, rng
+                    )
+                connection.send(None)
+            else:
+                _, generations_num, incoming = message
+                for island, migrants in incoming.items():
+                    islands[island].receive(migrants)
+                connection.send({island: islands[island].evolve(generations_num) for island in islands})
+        except Exception as error:
+            connection.send(error)
+
+
+class Island():
+    """ Sub population of one island, kept by the worker process between the epochs. """
+
+    def __init__(self, graph: Graph, population: list[list[int]], path_costs: list[list[float]], bypass_index,
+                 settings: dict, migration_size: int, rng: random.Random):
+        self.graph = graph
+        self.population = population
+        self.path_costs = path_costs
+        self.bypass_index = bypass_index
+        self.settings = settings
+        self.migration_size = migration_size
+        self.rng = rng
+        self.finished = False
+
+    def receive(self, migrants: list[tuple[list[int], list[float]]]) -> None:
+        for path, costs in migrants:
+            if path not in self.population:
+                self.population.append(path)
+                self.path_costs.append(costs)
+
+    def evolve(self, generations_num: int) -> tuple[bool, list[int], float, list[tuple[list[int], list[float]]]]:
+        """ Evolve the island for a few generations unless it can not evolve any further.
+            Return whether it is finished, its best path with its length and its best migration_size paths. """
+        for generation in range(generations_num):
+            if self.finished:
+                break
+            survivors = evolve_generation(
+                self.graph, self.population, self.path_costs, self.bypass_index, rng=self.rng, **self.settings
+            )
+            if survivors is None:
+                self.finished = True
+            else:
+                self.population, self.path_costs = survivors
+
+        path_lengths = path_lengths_of(self.path_costs)
+        best_ids = sorted(range(len(self.population)), key=path_lengths.__getitem__)[:max(self.migration_size, 1)]
+        migrants = [(self.population[idx], self.path_costs[idx]) for idx in best_ids[:self.migration_size]]
+        return self.finished, self.population[best_ids[0]], path_lengths[best_ids[0]], migrants
@@ -1,6 +1,158 @@
-def main():
-    print("Hello from genetic-pathfinder!")
+import argparse
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+
+# Heavy packages which the core solvers should not load
+HEAVY_PACKAGES = ('networkx', 'fnss', 'numpy', 'tqdm', 'matplotlib')
+# Modules of the import report, from the core solvers to the whole toolbox
+REPORT_MODULES = ('python_graph', 'genetic_algorithm', 'baseline_algorithms', 'routing_table', 'stp_algorithm',
+                  'topology', 'benchmark')
+
+
+def add_graph_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--graph-file', help='graph saved by python_graph.Graph.save')
+    parser.add_argument('--fat-tree', type=int, metavar='K', help='build fnss fat tree with k ports instead')
+    parser.add_argument('--seed', type=int, help='seed of the fat tree weights and the genetic algorithm')
+
+
+def load_graph(args):
+    """ Open the graph file or build the fat tree. Only the fat tree needs networkx and fnss. """
+    if args.graph_file:
+        from python_graph import Graph
+        return Graph.load(args.graph_file)
+    if args.fat_tree:
+        from topology import build_fat_tree_graph
+        return build_fat_tree_graph(args.fat_tree, random.Random(args.seed))[1]
+    raise Exception('Pass --graph-file or --fat-tree.')
+
+
+def route(args) -> int:
+    """ Find a path from source to destination and print it with its cost. """
+    if args.algorithm == 'table':
+        from routing_table import RoutingTable
+        if not args.table_file:
+            raise Exception('Pass --table-file with the table algorithm.')
+        table = RoutingTable.load(args.table_file)
+        path = table.path(args.source, args.destination)
+        table.close()
+        print(f'path = {path}')
+        return 0 if path else 1
+
+    graph = load_graph(args)
+    if args.algorithm == 'genetic':
+        from genetic_algorithm import fitness, genetic
+        path = genetic(graph, args.source, args.destination, population_size=args.population_size,
+                       rng=random.Random(args.seed))
+        cost = fitness(path, graph)
+    else:
+        import baseline_algorithms
+        path, cost = getattr(baseline_algorithms, args.algorithm)(graph, args.source, args.destination)
+    print(f'path = {path}, cost = {cost}')
+    return 0 if cost != float('inf') else 1
+
+
+def bench(args) -> int:
+    import benchmark
+    return benchmark.main(args.benchmark_args)
+
+
+def precompute(args) -> int:
+    """ Build routing table file of the graph. """
+    from routing_table import precompute as precompute_table
+    graph = load_graph(args)
+    options = {'population_size': args.population_size} if args.algorithm == 'genetic' else {}
+    start = time.perf_counter()
+    precompute_table(graph, args.output, algorithm=args.algorithm, **options).close()
+    print(f'{graph.num_nodes} destinations in {time.perf_counter() - start:.2f} sec, saved to {args.output}')
+    return 0
+
+
+def stp(args) -> int:
+    """ Build spanning tree of the graph links, ports are numbered by neighbours of every node. """
+    import stp_algorithm
+    graph = load_graph(args)
+    links = [(node, neighbour, {'port': port, 'weight': weight})
+             for node in range(graph.num_nodes)
+             for port, (neighbour, weight) in enumerate(graph.out_edges(node), start=1)]
+    start = time.perf_counter()
+    link_tree = stp_algorithm.build_link_tree(links)
+    stp_algorithm.remove_cycles(link_tree)
+    stp_algorithm.remove_identical_links(link_tree)
+    spanning_tree = stp_algorithm.build_spanning_tree(link_tree, list(range(graph.num_nodes)), args.root)
+    if spanning_tree is None:
+        print('Graph is not connected')
+        return 1
+    stp_algorithm.set_reverse_links(spanning_tree, link_tree)
+    elapsed = time.perf_counter() - start
+    tree_links = sum(map(len, spanning_tree.values()))
+    print(f'{tree_links} spanning tree links of {len(links)} in {elapsed:.3f} sec')
+    return 0
+
+
+def import_report(args) -> int:
+    """ Import every module in a fresh interpreter with -X importtime and print its cumulative import time
+        and the heavy packages it loads. """
+    print(f"{'module':<22} {'import ms':>10}  heavy packages")
+    for module in args.modules or REPORT_MODULES:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        # lines look like "import time:   self [us] |   cumulative |   package", nested imports are indented
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+            if match:
+                cumulative[match.group(4)] = int(match.group(2))
+        if result.returncode != 0 or module not in cumulative:
+            print(f'{module:<22} {"failed":>10}  {result.stderr.strip().splitlines()[-1:]}')
+            continue
+        heavy = [f'{package} {cumulative[package] / 1000:.0f} ms' for package in HEAVY_PACKAGES
+                 if package in cumulative]
+        print(f"{module:<22} {cumulative[module] / 1000:>10.1f}  {', '.join(heavy) or '-'}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Genetic path finding in datacenter fabrics.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    route_parser = commands.add_parser('route', help='find a path between two nodes')
+    route_parser.add_argument('source', type=int)
+    route_parser.add_argument('destination', type=int)
+    route_parser.add_argument('--algorithm', default='genetic',
+                              choices=['genetic', 'dijkstra', 'bidirectional_dijkstra', 'a_star', 'table'])
+    route_parser.add_argument('--population-size', type=int, default=40)
+    route_parser.add_argument('--table-file', help='routing table file for the table algorithm')
+    add_graph_arguments(route_parser)
+    route_parser.set_defaults(handler=route)
+
+    bench_parser = commands.add_parser('bench', help='run benchmark.py with the remaining arguments')
+    bench_parser.add_argument('benchmark_args', nargs=argparse.REMAINDER)
+    bench_parser.set_defaults(handler=bench)
+
+    precompute_parser = commands.add_parser('precompute', help='build a memory-mappable routing table')
+    precompute_parser.add_argument('--output', required=True)
+    precompute_parser.add_argument('--algorithm', default='dijkstra', choices=['dijkstra', 'genetic'])
+    precompute_parser.add_argument('--population-size', type=int, default=40)
+    add_graph_arguments(precompute_parser)
+    precompute_parser.set_defaults(handler=precompute)
+
+    stp_parser = commands.add_parser('stp', help='build spanning tree of the graph')
+    stp_parser.add_argument('--root', type=int, default=0)
+    add_graph_arguments(stp_parser)
+    stp_parser.set_defaults(handler=stp)
+
+    imports_parser = commands.add_parser('imports', help='report import time of the modules')
+    imports_parser.add_argument('modules', nargs='*')
+    imports_parser.set_defaults(handler=import_report)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
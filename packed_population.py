@@ -0,0 +1,244 @@
+import random
+from array import array
+from genetic_algorithm import (
+    BypassIndex, CROSSOVER_STRATEGIES, generate_initial_population, get_sub_graph_cache, MUTATION_STRATEGIES,
+    run_generations, SubGraphCache, selection
+)
+from python_graph import Graph
+
+
+class PackedPopulation():
+    """ Population of paths packed into preallocated flat buffers instead of a list per path.
+
+        Path idx occupies slots offsets[idx]:offsets[idx] + lengths[idx] of the int32 nodes buffer, its prefix
+        costs occupy the same slots of the float64 prefix_costs buffer and path_costs[idx] is its total cost.
+        Mutation changes a path in its own slots, it never makes the path longer. Crossover writes both children
+        after the used part of the buffers, parents slots stay dead until compact() moves survivors to the front. """
+
+    def __init__(self, buffer_size=1024):
+        self.nodes = array('i', bytes(4 * buffer_size))
+        self.prefix_costs = array('d', bytes(8 * buffer_size))
+        self.used = 0
+        self.offsets = array('q')
+        self.lengths = array('i')
+        self.path_costs = array('d')
+
+    @classmethod
+    def from_paths(cls, population: list[list[int]], graph: Graph) -> 'PackedPopulation':
+        """ Pack the paths and calculate their prefix costs. The buffers get room for one generation
+            of children, so crossover does not grow them in the common case. """
+        packed = cls(2 * sum(map(len, population)) or 1)
+        for path in population:
+            packed.append(path, graph)
+        return packed
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def path(self, idx: int) -> list[int]:
+        offset = self.offsets[idx]
+        return self.nodes[offset:offset + self.lengths[idx]].tolist()
+
+    def paths(self) -> list[list[int]]:
+        return [self.path(idx) for idx in range(len(self))]
+
+    def best(self) -> int:
+        """ Return id of the shortest path. """
+        return self.path_costs.index(min(self.path_costs))
+
+    def append(self, path: list[int], graph: Graph) -> int:
+        """ Add path to the population, return its id. """
+        self._reserve(len(path))
+        offset = self.used
+        self.nodes[offset:offset + len(path)] = array('i', path)
+        self.used += len(path)
+        self.offsets.append(offset)
+        self.lengths.append(len(path))
+        self.path_costs.append(0.0)
+        idx = len(self.offsets) - 1
+        self._score(idx, graph)
+        return idx
+
+    def crossover(self, id1: int, id2: int, graph: Graph, rng=random, strategy='single') -> bool:
+        """ Replace both paths with crossover children, strategy is one of CROSSOVER_STRATEGIES keys.
+            Children prefix costs are shifted parents costs. Return False if the paths have no common node
+            to cut at. """
+        parents = ((self.offsets[id1], self.lengths[id1]), (self.offsets[id2], self.lengths[id2]))
+        nodes, prefix_costs = self.nodes, self.prefix_costs
+        (offset1, length1), (offset2, length2) = parents
+        cuts = CROSSOVER_STRATEGIES[strategy](
+            nodes[offset1:offset1 + length1], nodes[offset2:offset2 + length2], rng
+        )
+        if not cuts:
+            return False
+
+        # children of broken parents are scored from scratch, as in genetic_algorithm.crossover_with_costs
+        shift_costs = self.path_costs[id1] != float('inf') and self.path_costs[id2] != float('inf')
+        self._reserve(length1 + length2)
+        children = []
+        for child_idx in range(2):
+            child = write = self.used
+            starts = (0, 0)
+            cut_cost = 0.0
+            # children switch to the other parent at every cut
+            for cut_idx, ends in enumerate(cuts + [(length1, length2)]):
+                parent_idx = (child_idx + cut_idx) % 2
+                offset, length = parents[parent_idx]
+                start, end = offset + starts[parent_idx], offset + ends[parent_idx]
+                nodes[write:write + end - start] = nodes[start:end]
+                if shift_costs:
+                    shift = cut_cost - prefix_costs[start]
+                    for slot in range(start, end):
+                        prefix_costs[write + slot - start] = prefix_costs[slot] + shift
+                    if end < offset + length:
+                        cut_cost = prefix_costs[end] + shift
+                write += end - start
+                starts = ends
+            self.used = write
+            children.append((child, write - child))
+
+        for idx, (child, length) in zip((id1, id2), children):
+            self.offsets[idx], self.lengths[idx] = child, length
+            if shift_costs:
+                self.path_costs[idx] = prefix_costs[child + length - 1]
+            else:
+                self._score(idx, graph)
+        return True
+
+    def mutation(self, idx: int, bypass_index: BypassIndex, graph: Graph, rng=random,
+                 strategy='node') -> bool:
+        """ Replace part of the path picked by one of MUTATION_STRATEGIES with a bypass node in its own slots,
+            the tail moves down if the path gets shorter. Prefix costs are updated by the two new links.
+            Return False if nothing can be replaced. """
+        offset, length = self.offsets[idx], self.lengths[idx]
+        nodes, prefix_costs = self.nodes, self.prefix_costs
+        point = MUTATION_STRATEGIES[strategy](nodes[offset:offset + length], bypass_index, rng)
+        if point is None:
+            return False
+
+        start, end, new_node = point
+        position, tail = offset + start + 1, offset + end
+        link_in, link_out = graph.weight(nodes[position - 1], new_node), graph.weight(new_node, nodes[tail])
+        tail_cost = prefix_costs[tail]
+        nodes[position] = new_node
+        removed = end - start - 2
+        if removed:
+            nodes[position + 1:offset + length - removed] = nodes[tail:offset + length]
+            prefix_costs[position + 1:offset + length - removed] = prefix_costs[tail:offset + length]
+            length -= removed
+            self.lengths[idx] = length
+        if self.path_costs[idx] == float('inf') or link_in == 0 or link_out == 0:
+            self._score(idx, graph)
+            return True
+
+        new_cost = prefix_costs[position - 1] + link_in
+        delta = new_cost + link_out - tail_cost
+        prefix_costs[position] = new_cost
+        for slot in range(position + 1, offset + length):
+            prefix_costs[slot] += delta
+        self.path_costs[idx] = prefix_costs[offset + length - 1]
+        return True
+
+    def compact(self, survivors_ids: list[int]) -> None:
+        """ Keep only the survivors and move their slots to the front of the buffers. """
+        survivors_ids = sorted(survivors_ids)
+        # ids only move down, so the index arrays are compacted in place
+        for new_idx, idx in enumerate(survivors_ids):
+            self.offsets[new_idx] = self.offsets[idx]
+            self.lengths[new_idx] = self.lengths[idx]
+            self.path_costs[new_idx] = self.path_costs[idx]
+        del self.offsets[len(survivors_ids):]
+        del self.lengths[len(survivors_ids):]
+        del self.path_costs[len(survivors_ids):]
+
+        # slots in buffer order only move down as well, so they never overwrite a slot which is not moved yet
+        used = 0
+        for idx in sorted(range(len(self.offsets)), key=self.offsets.__getitem__):
+            offset, length = self.offsets[idx], self.lengths[idx]
+            if offset != used:
+                self.nodes[used:used + length] = self.nodes[offset:offset + length]
+                self.prefix_costs[used:used + length] = self.prefix_costs[offset:offset + length]
+                self.offsets[idx] = used
+            used += length
+        self.used = used
+
+    def _reserve(self, size: int) -> None:
+        """ Grow the buffers to the smallest power of two which fits size more slots after the used part. """
+        buffer_size = len(self.nodes)
+        if self.used + size <= buffer_size:
+            return
+        new_size = 1 << (self.used + size - 1).bit_length()
+        self.nodes.frombytes(bytes(4 * (new_size - buffer_size)))
+        self.prefix_costs.frombytes(bytes(8 * (new_size - buffer_size)))
+
+    def _score(self, idx: int, graph: Graph) -> None:
+        """ Calculate prefix costs of the path from scratch, inf from the first missing link onwards. """
+        offset, length = self.offsets[idx], self.lengths[idx]
+        nodes, prefix_costs, weight = self.nodes, self.prefix_costs, graph.weight
+        path_cost = 0.0
+        prefix_costs[offset] = path_cost
+        for slot in range(offset + 1, offset + length):
+            edge_cost = weight(nodes[slot - 1], nodes[slot])
+            path_cost = path_cost + edge_cost if edge_cost != 0 else float('inf')
+            prefix_costs[slot] = path_cost
+        self.path_costs[idx] = path_cost
+
+
+def evolve_packed_generation(
+        graph: Graph, population: PackedPopulation, bypass_index: BypassIndex,
+        crossover_prob=0.6, mutation_prob=0.1, survival_pct=0.5, selection_strategy='roulette', rng=random,
+        crossover_strategy='single', mutation_strategy='node'
+) -> bool:
+    """ Packed version of genetic_algorithm.evolve_generation, the population is changed in place.
+        Return False if only the best path would survive. """
+    # crossover selection
+    parents_ids = selection(population.path_costs, crossover_prob, strategy=selection_strategy, rng=rng)
+    # when some path has no pair, skip it
+    if len(parents_ids) % 2 == 1:
+        parents_ids.pop()
+    for idx in range(0, len(parents_ids), 2):
+        population.crossover(parents_ids[idx], parents_ids[idx+1], graph, rng, crossover_strategy)
+
+    # mutation selection, reverse probabilities to choose the worst paths for mutation first
+    mutation_ids = selection(
+        population.path_costs, mutation_prob, reverse_prob=True, strategy=selection_strategy, rng=rng
+    )
+    for idx in mutation_ids:
+        population.mutation(idx, bypass_index, graph, rng, mutation_strategy)
+
+    # survivors selection
+    survivors_ids = selection(
+        population.path_costs, survival_pct, preserve_best=True, strategy=selection_strategy, rng=rng
+    )
+    if len(survivors_ids) <= 1:
+        return False
+    population.compact(survivors_ids)
+    return True
+
+
+def packed_genetic(graph: Graph, source: int, destination: int,
+                   population_size=4, max_generations_num=6, crossover_prob=0.6,
+                   mutation_prob=0.1, survival_pct=0.5, max_generations_unimproved=2,
+                   sub_graph_cache: SubGraphCache = None, selection_strategy='roulette',
+                   rng=random, seed_paths: list[list[int]] = (), seed_ratio=0.25, crossover_strategy='single',
+                   mutation_strategy='node',
+                   ) -> list[int]:
+    """ genetic_algorithm.genetic on a packed population, for populations of tens of thousands of paths.
+        Only the initial population is created as a list of paths. """
+
+    if sub_graph_cache is None:
+        sub_graph_cache = get_sub_graph_cache(graph)
+    sub_graph_nodes, sub_graph_adj_lists = sub_graph_cache.get(graph, destination)
+    bypass_index = sub_graph_cache.get_bypass_index(graph)
+    population = PackedPopulation.from_paths(generate_initial_population(
+        source, destination, population_size, sub_graph_nodes, sub_graph_adj_lists, rng, seed_paths, seed_ratio
+    ), graph)
+    population = run_generations(
+        population,
+        lambda survivors: survivors if evolve_packed_generation(
+            graph, survivors, bypass_index, crossover_prob, mutation_prob, survival_pct,
+            selection_strategy, rng, crossover_strategy, mutation_strategy
+        ) else None,
+        lambda survivors: survivors.path_costs, max_generations_num, max_generations_unimproved
+    )
+    return population.path(population.best())
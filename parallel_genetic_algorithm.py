@@ -1,94 +1,108 @@
-from concurrent.futures import ThreadPoolExecutor, Future
-from genetic_algorithm import create_sub_graph_adj_lists, crossover, fitness, fitness_all, generate_initial_population, mutation, reverse_dfs, selection
+from concurrent.futures import ThreadPoolExecutor
+from genetic_algorithm import best_path, crossover_pairs, evolve_generation, generate_initial_population, GeneticStats, get_sub_graph_cache, mutate_paths, path_lengths_of, prefix_costs_all, run_generations
+from python_graph import Graph
 
+import random
 import sys
-print(f"{sys._is_gil_enabled()=}\n")
+import time
 
 
-class ParallelGenetic():
+def is_free_threaded() -> bool:
+    """ True if the interpreter runs without the GIL, so threads can run Python code in parallel. """
+    return not getattr(sys, '_is_gil_enabled', lambda: True)()
+
 
-    def __init__(self, graph_data: list[list[int]], population_size: int, cpus=2):
-        self.graph_data = graph_data
+class ParallelGenetic():
+    """ Genetic algorithm on a thread pool: the initialization, crossover, mutation and fitness work of
+        genetic_algorithm.run_generations is split into one chunk per thread, and every chunk draws from
+        its own random.Random seeded from the master seed, so results only depend on the seed and the number
+        of threads. The chunks only run in parallel on a free-threaded interpreter. Set stats to a GeneticStats
+        instance to collect phase timings and counters, they are recorded by the calling thread around every
+        phase. """
+
+    def __init__(self, graph: Graph, population_size: int, cpus=2, seed=None):
+        self.graph = graph
+        self.sub_graph_cache = get_sub_graph_cache(graph)
         self.population_size = population_size
+        self.cpus = cpus
         self.pool = ThreadPoolExecutor(cpus)
-        self.tasks: list[Future] = []
+        self.rng = random.Random(seed)
+        self.population_costs = prefix_costs_all
+        self.stats: GeneticStats = None
 
         self.max_generations_num = 6
         self.crossover_prob = 0.6
         self.mutation_prob = 0.1
         self.survival_pct = 0.5
         self.max_generations_unimproved = 2
+        self.selection_strategy = 'roulette'
+        self.crossover_strategy = 'single'
+        self.mutation_strategy = 'node'
 
     def genetic(self, source: int, destination: int) -> list[int]:
-        sub_graph_nodes = reverse_dfs(destination, self.graph_data)
-        sub_graph_adj_lists = create_sub_graph_adj_lists(sub_graph_nodes, self.graph_data)
-        population = generate_initial_population(source, destination, self.population_size, sub_graph_nodes, sub_graph_adj_lists)
-        path_lengths = fitness_all(population, self.graph_data)
-        generations_unimproved = 0
-        last_best_length = float('inf')
-
-        for generation in range(self.max_generations_num):
-            # crossover selection
-            parents_ids = selection(path_lengths, self.crossover_prob)
-            # when some path has no pair, skip it
-            if len(parents_ids) % 2 == 1:
-                parents_ids.pop()
-
-            # crossover through the population
-            pairs_ids = range(0, len(parents_ids), 2)
-            for idx in pairs_ids:
-                self._submit_task(crossover_pair, (idx, population, parents_ids, path_lengths, self.graph_data))
-            self._await_tasks()
-
-            # mutation selection, reverse probabilities to choose the worst paths for mutation first
-            mutation_ids = selection(path_lengths, self.mutation_prob, reverse_prob=True)
-            for idx in mutation_ids:
-                self._submit_task(mutate, (idx, population, sub_graph_adj_lists, path_lengths, self.graph_data))
-            self._await_tasks()
-
-            # survivors selection
-            survivors_ids = selection(path_lengths, self.survival_pct, preserve_best=True)
-            # if there are no survivors (one preserved), stop on current generation
-            if len(survivors_ids) <= 1:
-                break
-            # best fitted path remain, others die
-            population = [population[idx] for idx in survivors_ids]
-            path_lengths = [path_lengths[idx] for idx in survivors_ids]
-
-            current_best_length = min(path_lengths)
-            if current_best_length >= last_best_length:
-                generations_unimproved += 1
-            else:
-                generations_unimproved = 0
-            last_best_length = current_best_length
-
-            if generations_unimproved >= self.max_generations_unimproved:
-                # print(f"Termination because there has been no improvement for {generations_unimproved} generations.")
-                break
-
-        # print('result paths =', population)
-        best_path_id = path_lengths.index(min(path_lengths))
-        return population[best_path_id]
-
-    def _submit_task(self, func, args) -> None:
-        task = self.pool.submit(func, *args)
-        self.tasks.append(task)
-    
-    def _await_tasks(self) -> None:
-        for task in self.tasks:
-            task.result()
-
-
-def crossover_pair(idx, population, parents_ids, path_lengths, graph_data) -> None:
-    parent1, parent2 = population[parents_ids[idx]], population[parents_ids[idx+1]]
-    child1, child2 = crossover(parent1, parent2)
-    population[parents_ids[idx]], population[parents_ids[idx+1]] = child1, child2
-    # update new path fitness
-    path_lengths[parents_ids[idx]] = fitness(child1, graph_data)
-    path_lengths[parents_ids[idx + 1]] = fitness(child2, graph_data)
-
-
-def mutate(idx, population, sub_graph_adj_lists, path_lengths, graph_data) -> None:
-    population[idx] = mutation(population[idx], sub_graph_adj_lists)
-    # update path length after mutation
-    path_lengths[idx] = fitness(population[idx], graph_data)
+        stats = self.stats
+        if stats is not None:
+            phase_start = time.perf_counter()
+        sub_graph_nodes, sub_graph_adj_lists = self.sub_graph_cache.get(self.graph, destination, stats)
+        bypass_index = self.sub_graph_cache.get_bypass_index(self.graph)
+        if stats is not None:
+            phase_start = stats.record('setup', phase_start)
+        chunk_sizes = [len(chunk) for chunk in self._split(range(self.population_size))]
+        population, path_costs = [], []
+        for chunk_population, chunk_path_costs in self._map_chunks(
+                generate_chunk, chunk_sizes, source, destination, sub_graph_nodes, sub_graph_adj_lists,
+                self.graph, self.population_costs):
+            population.extend(chunk_population)
+            path_costs.extend(chunk_path_costs)
+        if stats is not None:
+            # chunks create and score their paths together, initialization time includes the fitness
+            stats.record('initialization', phase_start, fitness_evaluations=len(population))
+
+        population, path_costs = run_generations(
+            (population, path_costs),
+            lambda survivors: evolve_generation(
+                self.graph, *survivors, bypass_index, self.crossover_prob, self.mutation_prob, self.survival_pct,
+                self.selection_strategy, self.rng, self.crossover_strategy, self.mutation_strategy, stats,
+                self._crossover_chunks, self._mutation_chunks
+            ),
+            lambda survivors: path_lengths_of(survivors[1]), self.max_generations_num,
+            self.max_generations_unimproved, stats
+        )
+        return best_path(population, path_costs)
+
+    def _crossover_chunks(self, pairs, population, path_costs, graph, rng, strategy) -> None:
+        """ Crossover executor with a chunk of pairs for every thread, every chunk derives costs of its own
+            children. """
+        self._map_chunks(crossover_pairs, self._split(pairs), population, path_costs, graph, strategy=strategy)
+
+    def _mutation_chunks(self, mutation_ids, population, path_costs, bypass_index, graph, rng, strategy) -> None:
+        """ Mutation executor with a chunk of mutated paths for every thread. """
+        self._map_chunks(
+            mutate_paths, self._split(mutation_ids), population, path_costs, bypass_index, graph, strategy=strategy
+        )
+
+    def _split(self, items) -> list:
+        """ Split items into one contiguous chunk per thread. """
+        chunk_size, remainder = divmod(len(items), self.cpus)
+        chunks, start = [], 0
+        for chunk_id in range(self.cpus):
+            end = start + chunk_size + (chunk_id < remainder)
+            chunks.append(items[start:end])
+            start = end
+        return chunks
+
+    def _map_chunks(self, func, chunks: list, *args, **kwargs) -> list:
+        """ Run func(chunk, *args, rng=chunk_rng, **kwargs) for every chunk in the pool and return results in chunk
+            order. Seeds are drawn for every chunk, even an empty one, to keep the master random sequence stable. """
+        seeds = [self.rng.getrandbits(64) for _ in chunks]
+        tasks = [self.pool.submit(func, chunk, *args, rng=random.Random(seed), **kwargs)
+                 for seed, chunk in zip(seeds, chunks) if chunk]
+        return [task.result() for task in tasks]
+
+
+def generate_chunk(chunk_size, source, destination, sub_graph_nodes, sub_graph_adj_lists, graph, population_costs,
+                   rng=random) -> tuple[list[list[int]], list[list[float]]]:
+    population = generate_initial_population(
+        source, destination, chunk_size, sub_graph_nodes, sub_graph_adj_lists, rng
+    )
+    return population, population_costs(population, graph)
@@ -1,9 +1,27 @@
 # from matplotlib import pyplot as plt
-import networkx as nx
+import mmap
 import random
+import struct
+from array import array
+from itertools import compress
+
+
+# magic, format version, is directed, is weighted, typecode of the weights, number of nodes, number of edge slots
+GRAPH_FILE_HEADER = struct.Struct('<4sH??c7xqq')
+GRAPH_FILE_MAGIC = b'CSRG'
+GRAPH_FILE_VERSION = 1
+# CSR arrays in the order of the graph file, every array starts at a multiple of 8 bytes
+GRAPH_FILE_ARRAYS = ('offsets', 'targets', 'weights', 'in_offsets', 'in_sources', 'in_slots')
 
 
 class Graph:
+    """ Directed or undirected graph stored in compressed sparse row (CSR) form.
+
+        Outgoing edges of the node n occupy slots offsets[n]:offsets[n + 1] of the targets and weights arrays,
+        sorted by target. Incoming edges are indexed the same way by in_offsets, in_sources and in_slots, where
+        in_slots points back to the weight slot of the edge, so both directions always see the same weight.
+        Removed edges keep their slot with zero weight until the next rebuild. """
+
     def __init__(self, num_nodes: int, edges: list[tuple], is_directed=False):
         if len(edges) < 1:
             raise Exception('Graph should contain at least one node.')
@@ -18,63 +36,239 @@ class Graph:
 
         self._is_directed = is_directed
         self.num_nodes = num_nodes
-        self.data = [[0] * num_nodes for _ in range(num_nodes)]
-        self.adjacency_lists = [[] * num_nodes for _ in range(num_nodes)]
+        # Incremented on every edge change, so derived structures can tell they are stale
+        self.version = 0
+        edge_weights = {}
+        for edge in edges:
+            n1, n2, weight = self._unpack_edge(edge)
+            edge_weights[n1 * num_nodes + n2] = weight
+            if not is_directed:
+                edge_weights[n2 * num_nodes + n1] = weight
+        self._build(edge_weights)
+
+    def _unpack_edge(self, edge: tuple) -> tuple[int, int, int | float]:
         if self._is_weighted:
-            for n1, n2, data in edges:
-                self.data[n1][n2] = data['weight']
-                self.adjacency_lists[n1].append(n2)
-                if not is_directed:
-                    self.data[n2][n1] = data['weight']
-                    self.adjacency_lists[n2].append(n1)
-        else:
-            for n1, n2 in edges:
-                self.data[n1][n2] = 1
-                self.adjacency_lists[n1].append(n2)
-                if not is_directed:
-                    self.data[n2][n1] = 1
-                    self.adjacency_lists[n2].append(n1)
+            if len(edge) != 3:
+                raise Exception('Wrong edge type for weighted graph, should be tuple(int, int, dict).')
+            n1, n2, data = edge
+            self._check_nodes(n1, n2)
+            return n1, n2, data['weight']
+        if len(edge) != 2:
+            raise Exception('Wrong edge type for unweighted graph, should be tuple(int, int).')
+        n1, n2 = edge
+        self._check_nodes(n1, n2)
+        return n1, n2, 1
+
+    def _check_nodes(self, n1: int, n2: int) -> None:
+        # Edge keys n1 * num_nodes + n2 of out of range nodes would alias edges of other nodes
+        if not (0 <= n1 < self.num_nodes and 0 <= n2 < self.num_nodes):
+            raise IndexError(f'Edge {n1} -> {n2} is out of range of {self.num_nodes} nodes.')
+
+    def _build(self, edge_weights: dict[int, int | float]) -> None:
+        """ Fill CSR arrays from the map of edge keys (n1 * num_nodes + n2) to weights. """
+        num_nodes = self.num_nodes
+        keys = sorted(edge_weights)
+        typecode = 'q' if all(type(weight) is int for weight in edge_weights.values()) else 'd'
+        self.offsets = array('i', [0] * (num_nodes + 1))
+        self.targets = array('i', [key % num_nodes for key in keys])
+        self.weights = array(typecode, [edge_weights[key] for key in keys])
+        for key in keys:
+            self.offsets[key // num_nodes + 1] += 1
+        for node in range(num_nodes):
+            self.offsets[node + 1] += self.offsets[node]
+        self._edge_slots = dict(zip(keys, range(len(keys))))
+        self._build_reverse_index()
+
+    def _build_reverse_index(self) -> None:
+        """ Counting sort of the edge slots by their target node. """
+        num_nodes = self.num_nodes
+        self.in_offsets = array('i', [0] * (num_nodes + 1))
+        for target in self.targets:
+            self.in_offsets[target + 1] += 1
+        for node in range(num_nodes):
+            self.in_offsets[node + 1] += self.in_offsets[node]
+
+        self.in_sources = array('i', [0] * len(self.targets))
+        self.in_slots = array('i', [0] * len(self.targets))
+        next_position = self.in_offsets[:-1]
+        for source in range(num_nodes):
+            for slot in range(self.offsets[source], self.offsets[source + 1]):
+                target = self.targets[slot]
+                position = next_position[target]
+                next_position[target] += 1
+                self.in_sources[position] = source
+                self.in_slots[position] = slot
+
+    def __getattr__(self, name: str):
+        # Graph loaded from a file builds its edge slots map on the first weight lookup
+        if name == '_edge_slots':
+            num_nodes, offsets, targets = self.num_nodes, self.offsets, self.targets
+            self._edge_slots = {node * num_nodes + targets[slot]: slot
+                                for node in range(num_nodes) for slot in range(offsets[node], offsets[node + 1])}
+            return self._edge_slots
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __getstate__(self) -> dict:
+        # Arrays of a loaded graph are views of the mapped file, which can not be pickled
+        state = self.__dict__.copy()
+        state.pop('_mapped_file', None)
+        for name in GRAPH_FILE_ARRAYS:
+            if isinstance(state[name], memoryview):
+                state[name] = array(state[name].format, state[name].tobytes())
+        return state
+
+    def _weights_typecode(self) -> str:
+        # weights of a loaded graph are a memoryview, which names its typecode format
+        return self.weights.typecode if isinstance(self.weights, array) else self.weights.format
+
+    def save(self, file_path: str) -> None:
+        """ Write the CSR arrays into a binary file: header followed by the raw arrays. """
+        typecode = self._weights_typecode()
+        with open(file_path, 'wb') as file:
+            file.write(GRAPH_FILE_HEADER.pack(
+                GRAPH_FILE_MAGIC, GRAPH_FILE_VERSION, self._is_directed, self._is_weighted, typecode.encode(),
+                self.num_nodes, len(self.targets)
+            ))
+            for name in GRAPH_FILE_ARRAYS:
+                data = bytes(getattr(self, name))
+                file.write(data + bytes(-len(data) % 8))
+
+    @classmethod
+    def load(cls, file_path: str) -> 'Graph':
+        """ Open graph saved by save(). The file is memory-mapped copy on write and the arrays are views
+            of the mapping, so loading does not depend on the graph size. Edge changes stay in memory. """
+        with open(file_path, 'rb') as file:
+            mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, is_directed, is_weighted, typecode, num_nodes, num_edges = \
+            GRAPH_FILE_HEADER.unpack_from(mapped_file)
+        if magic != GRAPH_FILE_MAGIC or version != GRAPH_FILE_VERSION:
+            mapped_file.close()
+            raise Exception(f'{file_path} is not a graph file of version {GRAPH_FILE_VERSION}.')
+
+        graph = cls.__new__(cls)
+        graph._is_directed = is_directed
+        graph._is_weighted = is_weighted
+        graph.num_nodes = num_nodes
+        graph.version = 0
+        graph._mapped_file = mapped_file
+        view = memoryview(mapped_file)
+        position = GRAPH_FILE_HEADER.size
+        for name, length, item_typecode in zip(
+                GRAPH_FILE_ARRAYS, (num_nodes + 1, num_edges, num_edges, num_nodes + 1, num_edges, num_edges),
+                ('i', 'i', typecode.decode(), 'i', 'i', 'i')):
+            size = length * struct.calcsize(item_typecode)
+            setattr(graph, name, view[position:position + size].cast(item_typecode))
+            position += size + (-size % 8)
+        return graph
 
     def __repr__(self):
-        header = '    '
-        for i in range(len(self.data)):
-            header += f'{i}: '
-        header += '\n'
-        return header + '\n'.join([f'{n}: {neighbours}' for n, neighbours in enumerate(self.data)])
+        return '\n'.join([f'{n}: {dict(self.out_edges(n))}' for n in range(self.num_nodes)])
 
     def __str__(self):
         return self.__repr__()
 
+    @property
+    def is_directed(self) -> bool:
+        return self._is_directed
+
+    @property
+    def num_edges(self) -> int:
+        """ Number of directed edge slots, including removed edges that have not been compacted yet. """
+        return len(self.targets)
+
+    def weight(self, n1: int, n2: int) -> int | float:
+        """ Return weight of the edge n1 -> n2 in O(1), or 0 if there is no such edge. """
+        slot = self._edge_slots.get(n1 * self.num_nodes + n2)
+        if slot is None:
+            return 0
+        return self.weights[slot]
+
+    def out_edges(self, node: int):
+        """ Iterate over (neighbour, weight) pairs of the outgoing edges of the node. """
+        start, end = self.offsets[node], self.offsets[node + 1]
+        weights = self.weights[start:end]
+        # removed edges have zero weight
+        return compress(zip(self.targets[start:end], weights), weights)
+
+    def neighbours(self, node: int) -> list[int]:
+        """ Return nodes reachable from the node by one edge. """
+        start, end = self.offsets[node], self.offsets[node + 1]
+        return [neighbour for neighbour, weight in zip(self.targets[start:end], self.weights[start:end]) if weight > 0]
+
+    def in_edges(self, node: int):
+        """ Iterate over (predecessor, weight) pairs of the incoming edges of the node. """
+        if not self._is_directed:
+            # both directions of an undirected edge have the same weight and rows are sorted by the neighbour
+            return self.out_edges(node)
+        start, end = self.in_offsets[node], self.in_offsets[node + 1]
+        weights = list(map(self.weights.__getitem__, self.in_slots[start:end]))
+        return compress(zip(self.in_sources[start:end], weights), weights)
+
+    def predecessors(self, node: int) -> list[int]:
+        """ Return nodes from which the node is reachable by one edge. """
+        weights = self.weights
+        start, end = self.in_offsets[node], self.in_offsets[node + 1]
+        return [source for source, slot in zip(self.in_sources[start:end], self.in_slots[start:end])
+                if weights[slot] > 0]
+
     def add_edge(self, edge: tuple):
-        if self._is_weighted:
-            if len(edge) != 3:
-                raise Exception('Wrong edge type for weighted graph, should be tuple(int, int, int).')
-            n1, n2, data = edge
-            self.data[n1][n2] = data['weight']
-            self.adjacency_lists[n1].append(n2)
-            if not self._is_directed:
-                self.data[n2][n1] = data['weight']
-                self.adjacency_lists[n2].append(n1)
-        else:
-            if len(edge) != 2:
-                raise Exception('Wrong edge type for unweighted graph, should be tuple(int, int).')
-            n1, n2 = edge
-            self.data[n1][n2] = 1
-            self.adjacency_lists[n1].append(n2)
-            if not self._is_directed:
-                self.data[n2][n1] = 1
-                self.adjacency_lists[n2].append(n1)
+        n1, n2, weight = self._unpack_edge(edge)
+        keys = [n1 * self.num_nodes + n2]
+        if not self._is_directed:
+            keys.append(n2 * self.num_nodes + n1)
+
+        fits_typecode = self._weights_typecode() == 'd' or type(weight) is int
+        if fits_typecode and all(key in self._edge_slots for key in keys):
+            # Edge slot already exists (e.g. the link was removed before), so only restore its weight
+            for key in keys:
+                self.weights[self._edge_slots[key]] = weight
+            self.version += 1
+            return
+
+        edge_weights = {key: self.weights[slot] for key, slot in self._edge_slots.items() if self.weights[slot] > 0}
+        for key in keys:
+            edge_weights[key] = weight
+        self._build(edge_weights)
+        self.version += 1
 
     def remove_edge(self, edge: tuple[int, int]):
         n1, n2 = edge
-        self.data[n1][n2] = 0
-        self.adjacency_lists[n1].remove(n2)
+        self._check_nodes(n1, n2)
+        keys = [n1 * self.num_nodes + n2]
         if not self._is_directed:
-            self.data[n2][n1] = 0
-            self.adjacency_lists[n2].remove(n1)
+            keys.append(n2 * self.num_nodes + n1)
+        for key in keys:
+            slot = self._edge_slots.get(key)
+            if slot is None or self.weights[slot] == 0:
+                raise Exception(f'Edge {key // self.num_nodes} -> {key % self.num_nodes} does not exist.')
+        for key in keys:
+            self.weights[self._edge_slots[key]] = 0
+        self.version += 1
+
+
+# networkx is imported by the functions below only, so the solvers do not load it with the graph
+
+
+def from_networkx(nx_graph: 'networkx.Graph', default_weight=1) -> Graph:
+    """ Build graph from networkx (e.g. fnss) topology with nodes 0..n-1, edges without weight get default_weight. """
+    edges = [(n1, n2, {'weight': data.get('weight', default_weight)}) for n1, n2, data in nx_graph.edges(data=True)]
+    return Graph(nx_graph.number_of_nodes(), edges, is_directed=nx_graph.is_directed())
+
+
+def to_networkx(graph: Graph) -> 'networkx.Graph':
+    """ Return networkx graph with the weighted edges of the graph, removed edges are skipped. """
+    import networkx as nx
+
+    nx_graph = nx.DiGraph() if graph.is_directed else nx.Graph()
+    nx_graph.add_nodes_from(range(graph.num_nodes))
+    nx_graph.add_edges_from((node, neighbour, {'weight': weight})
+                            for node in range(graph.num_nodes) for neighbour, weight in graph.out_edges(node))
+    return nx_graph
 
 
 def draw_directed_weighted_graph(edges, path=None):
+    import networkx as nx
+
     if len(edges[0]) == 3:
         edges = ((n1, n2, {"weight": weight}) for n1, n2, weight in edges)
     elif len(edges[0]) == 2:
@@ -0,0 +1,179 @@
+import mmap
+import struct
+import time
+import tracemalloc
+from array import array
+from baseline_algorithms import follow_next_hops, reverse_dijkstra
+from batch_routing import route_group_genetic
+from genetic_algorithm import get_sub_graph_cache
+from python_graph import Graph
+
+
+# magic, format version, typecode of the next hops, number of nodes
+HEADER = struct.Struct('<4sHcxq')
+MAGIC = b'RTBL'
+FORMAT_VERSION = 1
+
+
+def next_hops_dijkstra(graph: Graph, destination: int, sources: list[int] = None, **options) -> list[int]:
+    """ Next hops of the shortest path tree towards the destination, sources are not needed. """
+    next_hop, _ = reverse_dijkstra(graph, destination)
+    return next_hop
+
+
+def next_hops_genetic(graph: Graph, destination: int, sources: list[int] = None, **options) -> list[int]:
+    """ Next hops merged from genetic paths of every source (all nodes which reach destination by default).
+        Cycles of every path are cut first. The first path through a node sets its next hop, later paths which
+        reach the node continue along the earlier path, so every merged hop leads to destination. A source whose
+        hops still do not reach destination (e.g. its genetic path was lost) takes the next hops of the shortest
+        path tree from reverse_dijkstra until it joins a node which does. """
+    next_hop = [-1] * graph.num_nodes
+    if sources is None:
+        sources, _ = get_sub_graph_cache(graph).get(graph, destination)
+    sources = [source for source in sources if source != destination]
+    # unreachable sources come back with inf cost
+    for _, _, path, cost in route_group_genetic(graph, destination, sources, **options):
+        if cost == float('inf'):
+            continue
+        path = remove_cycles(path)
+        for node, hop in zip(path, path[1:]):
+            if next_hop[node] != -1:
+                break
+            next_hop[node] = hop
+
+    tree_next_hop = None
+    for source in sources:
+        if follow_next_hops(next_hop, source, destination):
+            continue
+        if tree_next_hop is None:
+            tree_next_hop, _ = reverse_dijkstra(graph, destination)
+        if tree_next_hop[source] == -1:
+            continue
+        # tree hops get strictly closer to destination, and nodes which reach it never lead through this chain
+        node = source
+        while not follow_next_hops(next_hop, node, destination):
+            next_hop[node] = tree_next_hop[node]
+            node = next_hop[node]
+    return next_hop
+
+
+def remove_cycles(path: list[int]) -> list[int]:
+    """ Return the path without its cycles, every node continues from its last occurrence. """
+    last_idx = {node: idx for idx, node in enumerate(path)}
+    loop_free = []
+    idx = 0
+    while idx < len(path):
+        loop_free.append(path[idx])
+        idx = last_idx[path[idx]] + 1
+    return loop_free
+
+
+NEXT_HOP_ALGORITHMS = {
+    'dijkstra': next_hops_dijkstra,
+    'genetic': next_hops_genetic,
+}
+
+
+class RoutingTable():
+    """ Next hop of every node towards every destination in one flat array of num_nodes rows, the row of
+        a destination holds next hop + 1 of every node, so zero (e.g. of a fresh sparse file) means no route.
+        Values are uint16 up to 65534 nodes and uint32 above. Loaded tables are read straight from
+        the memory-mapped file, without Python objects per entry. """
+
+    def __init__(self, num_nodes: int, next_hops, mapped_file: mmap.mmap = None):
+        self.num_nodes = num_nodes
+        self.next_hops = next_hops
+        self._mapped_file = mapped_file
+
+    @classmethod
+    def load(cls, file_path: str) -> 'RoutingTable':
+        with open(file_path, 'rb') as file:
+            mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, typecode, num_nodes = HEADER.unpack_from(mapped_file)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            mapped_file.close()
+            raise Exception(f'{file_path} is not a routing table file of version {FORMAT_VERSION}.')
+        next_hops = memoryview(mapped_file)[HEADER.size:].cast(typecode.decode())
+        return cls(num_nodes, next_hops, mapped_file)
+
+    def next_hop(self, source: int, destination: int) -> int:
+        """ Return next hop from source towards destination, -1 if there is no route. """
+        return self.next_hops[destination * self.num_nodes + source] - 1
+
+    def path(self, source: int, destination: int) -> list[int]:
+        """ Rebuild path by following next hops. Return empty path if destination is unreachable. """
+        row = destination * self.num_nodes
+        path = [source]
+        current = source
+        while current != destination:
+            current = self.next_hops[row + current] - 1
+            if current == -1 or len(path) > self.num_nodes:
+                return []
+            path.append(current)
+        return path
+
+    def close(self) -> None:
+        if self._mapped_file is not None:
+            self.next_hops.release()
+            self._mapped_file.close()
+            self._mapped_file = None
+
+
+def precompute(graph: Graph, file_path: str, algorithm='dijkstra', destinations: list[int] = None,
+               **options) -> RoutingTable:
+    """ Build next hops towards every destination (all nodes by default) with one of NEXT_HOP_ALGORITHMS and
+        write them into the memory-mapped file row by row, so only one row is held in memory during the build.
+        Options are passed to the algorithm, e.g. sources and population_size for genetic.
+        Return the table loaded from the file. """
+    next_hops_of = NEXT_HOP_ALGORITHMS[algorithm]
+    num_nodes = graph.num_nodes
+    typecode = 'H' if num_nodes < 2 ** 16 - 1 else 'I'
+    item_size = array(typecode).itemsize
+    if destinations is None:
+        destinations = range(num_nodes)
+
+    with open(file_path, 'w+b') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, typecode.encode(), num_nodes))
+        # rows of skipped destinations stay zero, i.e. without route
+        file.truncate(HEADER.size + num_nodes * num_nodes * item_size)
+        with mmap.mmap(file.fileno(), 0) as mapped_file:
+            for destination in destinations:
+                next_hop = next_hops_of(graph, destination, **options)
+                start = HEADER.size + destination * num_nodes * item_size
+                mapped_file[start:start + num_nodes * item_size] = array(
+                    typecode, [hop + 1 for hop in next_hop]
+                ).tobytes()
+            mapped_file.flush()
+
+    return RoutingTable.load(file_path)
+
+
+def main():
+    import random
+    from topology import build_fat_tree_graph
+
+    fat_tree_topology, graph = build_fat_tree_graph(16)
+    hosts = fat_tree_topology.hosts()
+
+    # tracing slows the build down, so peak memory comes from a separate build of a few destinations
+    tracemalloc.start()
+    precompute(graph, 'routing_table.bin', destinations=hosts[:64]).close()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    table = precompute(graph, 'routing_table.bin')
+    elapsed = time.perf_counter() - start
+    print(f"Precompute: {graph.num_nodes} destinations in {elapsed:.2f} sec, peak memory {peak_memory / 1024:.0f} KB")
+
+    pairs = [tuple(random.sample(hosts, 2)) for _ in range(100000)]
+    start = time.perf_counter()
+    for source, destination in pairs:
+        table.path(source, destination)
+    elapsed = time.perf_counter() - start
+    print(f"Query: {elapsed / len(pairs) * 1e6:.2f} us per path")
+    table.close()
+
+
+if __name__ == '__main__':
+    main()
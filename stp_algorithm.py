@@ -1,3 +1,7 @@
+import heapq
+import itertools
+
+
 def build_link_tree(links: list[tuple[int, int, dict]]):
     """ Create hash map of the links and their metrics """
     link_tree = {}
@@ -30,43 +34,40 @@ def remove_identical_links(link_tree: dict[int, dict[int, list]], metric='weight
 
 def build_spanning_tree(link_tree: dict[int, dict[int, dict]], nodes: list[int], root_node: int, metric='weight') \
         -> dict[int, dict[int, dict]] or None:
-    """ Build minimal spanning tree of the given tree of links. It is assumed that the input tree
-        does not have redundant links and same node cycles. Return None if graph is not connected.
-        Tip: it is better to pick center node as root. """
+    """ Build minimal spanning tree of the given tree of links with Prim's algorithm in O(E log V). It is assumed
+        that the input tree does not have redundant links and same node cycles. Return None if graph is not
+        connected. Tip: it is better to pick center node as root. """
     if not link_tree:
         return None
 
     spanning_tree = {}
     visited = {node: False for node in nodes}
-    stack = []
+    visited_num = 0
+    # links leaving the tree, the counter keeps equal metrics in insertion order without comparing dicts
+    heap = []
+    counter = itertools.count()
     current_node = root_node
 
-    # Iterate until all nodes marked as visited
     while True:
-        # If current node already has been visited, then its neighbours already have been put in the stack,
-        # so skip adding them again
-        if not visited[current_node]:
-            # Check if current node has outbound links
-            if current_node in link_tree:
-                links = [(current_node, dst_node, metrics) for dst_node, metrics in link_tree[current_node].items()]
-                # Descending sort of the adjacent links to extend the stack
-                links = sorted(links, key=lambda link: link[2][metric], reverse=True)
-                stack.extend(links)
-            visited[current_node] = True
-
-        if all(visited.values()):
+        visited[current_node] = True
+        visited_num += 1
+        if visited_num == len(visited):
             break
+        for dst_node, metrics in link_tree.get(current_node, {}).items():
+            if not visited[dst_node]:
+                heapq.heappush(heap, (metrics[metric], next(counter), current_node, dst_node, metrics))
 
-        # If stack is empty while not visited all nodes, then the graph is not connected
-        if not stack:
+        # Take the cheapest link to a new node, links to nodes visited since they were pushed are skipped
+        while heap and visited[heap[0][3]]:
+            heapq.heappop(heap)
+        # If no link leaves the tree while not visited all nodes, then the graph is not connected
+        if not heap:
             return None
 
-        src_node, dst_node, metrics = stack.pop()
-        # Add only links to new nodes
-        if not visited[dst_node]:
-            spanning_tree.setdefault(src_node, {})
-            spanning_tree[src_node][dst_node] = metrics
-            current_node = dst_node
+        _, _, src_node, dst_node, metrics = heapq.heappop(heap)
+        spanning_tree.setdefault(src_node, {})
+        spanning_tree[src_node][dst_node] = metrics
+        current_node = dst_node
 
     return spanning_tree
 
@@ -87,6 +88,186 @@ def set_reverse_links(spanning_tree: dict[int, dict[int, dict]], link_tree: dict
         spanning_tree[src_node].update(dst_nodes)
 
 
+class SpanningTree():
+    """ Spanning tree of the links which is repaired locally on link events instead of being rebuilt.
+
+        Links have the same (src, dst, {'port', 'weight'}) form as in build_link_tree. Parallel links are kept,
+        the best one by the metric is used, same node links are ignored. Tree links go from the root side
+        to the child like in build_spanning_tree, and spanning_tree also holds their reverse links like after
+        set_reverse_links. When a tree link fails or gets worse, the subtree below it is detached and attached
+        again by Prim's algorithm started from the links which cross the cut, so the work is proportional to
+        the subtree and its links. A new link which closes a cycle replaces the worst tree link of the cycle
+        the same way. Nodes which can not be reached stay in detached until a link brings them back. """
+
+    def __init__(self, links: list[tuple[int, int, dict]], nodes: list[int], root_node: int, metric='weight'):
+        self.metric = metric
+        self.root_node = root_node
+        self.all_links: dict[int, dict[int, list[dict]]] = {}
+        self.link_tree: dict[int, dict[int, dict]] = {}
+        self.in_links: dict[int, dict[int, dict]] = {}
+        self.spanning_tree: dict[int, dict[int, dict]] = {}
+        self.parent: dict[int, int | None] = {root_node: None}
+        self.children: dict[int, set[int]] = {root_node: set()}
+        self.depth: dict[int, int] = {root_node: 0}
+        self.detached: set[int] = set(nodes) - {root_node}
+
+        for src_node, dst_node, metrics in links:
+            if src_node != dst_node:
+                self.all_links.setdefault(src_node, {}).setdefault(dst_node, []).append(metrics)
+        for src_node, dst_nodes in self.all_links.items():
+            for dst_node in dst_nodes:
+                self._update_link(src_node, dst_node)
+        self._attach(self.detached)
+
+    @property
+    def is_connected(self) -> bool:
+        return not self.detached
+
+    def link_up(self, src_node: int, dst_node: int, metrics: dict) -> set[int]:
+        """ Add the link and repair the tree. Return nodes whose tree links have changed. """
+        if src_node == dst_node:
+            return set()
+        for node in (src_node, dst_node):
+            if node not in self.parent:
+                self.detached.add(node)
+        self.all_links.setdefault(src_node, {}).setdefault(dst_node, []).append(metrics)
+        old_metrics = self.link_tree.get(src_node, {}).get(dst_node)
+        self._update_link(src_node, dst_node)
+        new_metrics = self.link_tree[src_node][dst_node]
+
+        if src_node in self.detached:
+            return set()
+        if dst_node in self.detached:
+            # the link may bring back every detached node, not only its end
+            return self._attach(self.detached)
+        if new_metrics is old_metrics:
+            return set()
+        if self.parent[dst_node] == src_node:
+            if old_metrics[self.metric] < new_metrics[self.metric]:
+                return self._reattach_subtree(dst_node)
+            self._set_tree_link(src_node, dst_node)
+            return {dst_node}
+        if self.parent[src_node] == dst_node:
+            self._set_tree_link(dst_node, src_node)
+            return set()
+
+        worst_node = self._worst_cycle_link(src_node, dst_node)
+        if self._tree_link_metric(worst_node) > new_metrics[self.metric]:
+            return self._reattach_subtree(worst_node)
+        return set()
+
+    def link_down(self, src_node: int, dst_node: int, metrics: dict) -> set[int]:
+        """ Remove the link and repair the tree. Return nodes whose tree links have changed. """
+        parallel_links = self.all_links.get(src_node, {}).get(dst_node, [])
+        if metrics not in parallel_links:
+            raise Exception(f'Link {src_node} -> {dst_node} with {metrics} does not exist.')
+        parallel_links.remove(metrics)
+        old_metrics = self.link_tree[src_node][dst_node]
+        self._update_link(src_node, dst_node)
+        new_metrics = self.link_tree.get(src_node, {}).get(dst_node)
+
+        if new_metrics is old_metrics or src_node in self.detached or dst_node in self.detached:
+            return set()
+        if self.parent[dst_node] == src_node:
+            if new_metrics is None or old_metrics[self.metric] < new_metrics[self.metric]:
+                return self._reattach_subtree(dst_node)
+            self._set_tree_link(src_node, dst_node)
+            return {dst_node}
+        if self.parent[src_node] == dst_node:
+            self._set_tree_link(dst_node, src_node)
+        return set()
+
+    def _update_link(self, src_node: int, dst_node: int) -> None:
+        """ Pick the best of the parallel links, or remove the link if there are no more. """
+        parallel_links = self.all_links[src_node][dst_node]
+        if parallel_links:
+            best_metrics = min(parallel_links, key=lambda metrics: metrics[self.metric])
+            self.link_tree.setdefault(src_node, {})[dst_node] = best_metrics
+            self.in_links.setdefault(dst_node, {})[src_node] = best_metrics
+        else:
+            self.all_links[src_node].pop(dst_node)
+            self.link_tree[src_node].pop(dst_node, None)
+            self.in_links[dst_node].pop(src_node, None)
+
+    def _tree_link_metric(self, node: int):
+        return self.link_tree[self.parent[node]][node][self.metric]
+
+    def _set_tree_link(self, src_node: int, dst_node: int) -> None:
+        """ Write the tree link and its reverse link (if there is one) into spanning_tree. """
+        self.spanning_tree.setdefault(src_node, {})[dst_node] = self.link_tree[src_node][dst_node]
+        reverse_metrics = self.link_tree.get(dst_node, {}).get(src_node)
+        if reverse_metrics is not None:
+            self.spanning_tree.setdefault(dst_node, {})[src_node] = reverse_metrics
+        elif src_node in self.spanning_tree.get(dst_node, {}):
+            self._remove_tree_entry(dst_node, src_node)
+
+    def _remove_tree_entry(self, src_node: int, dst_node: int) -> None:
+        links = self.spanning_tree.get(src_node)
+        if links is not None and dst_node in links:
+            links.pop(dst_node)
+            if not links:
+                self.spanning_tree.pop(src_node)
+
+    def _worst_cycle_link(self, src_node: int, dst_node: int) -> int:
+        """ Walk from both nodes up to their common ancestor and return the child node of the tree link
+            with the largest metric on the way. """
+        worst_node, worst_metric = None, None
+        while src_node != dst_node:
+            # climb from the deeper node, it can not be the common ancestor
+            if self.depth[src_node] < self.depth[dst_node]:
+                src_node, dst_node = dst_node, src_node
+            link_metric = self._tree_link_metric(src_node)
+            if worst_metric is None or link_metric > worst_metric:
+                worst_node, worst_metric = src_node, link_metric
+            src_node = self.parent[src_node]
+        return worst_node
+
+    def _reattach_subtree(self, node: int) -> set[int]:
+        """ Detach the subtree of the node from the tree and attach it again through the best links. """
+        subtree = [node]
+        for subtree_node in subtree:
+            subtree.extend(self.children[subtree_node])
+        parent = self.parent[node]
+        self.children[parent].discard(node)
+        self._remove_tree_entry(parent, node)
+        self._remove_tree_entry(node, parent)
+        for subtree_node in subtree:
+            for child in self.children.pop(subtree_node):
+                self._remove_tree_entry(subtree_node, child)
+                self._remove_tree_entry(child, subtree_node)
+            self.parent.pop(subtree_node)
+            self.depth.pop(subtree_node)
+        self.detached.update(subtree)
+        return self._attach(self.detached) | set(subtree)
+
+    def _attach(self, nodes: set[int]) -> set[int]:
+        """ Prim's algorithm from the links of the tree into the detached nodes. Return attached nodes. """
+        heap = []
+        counter = itertools.count()
+        for dst_node in nodes:
+            for src_node, metrics in self.in_links.get(dst_node, {}).items():
+                if src_node in self.parent:
+                    heapq.heappush(heap, (metrics[self.metric], next(counter), src_node, dst_node))
+
+        attached = set()
+        while heap:
+            _, _, src_node, dst_node = heapq.heappop(heap)
+            if dst_node in self.parent:
+                continue
+            self.parent[dst_node] = src_node
+            self.children[src_node].add(dst_node)
+            self.children[dst_node] = set()
+            self.depth[dst_node] = self.depth[src_node] + 1
+            self._set_tree_link(src_node, dst_node)
+            attached.add(dst_node)
+            for next_node, metrics in self.link_tree.get(dst_node, {}).items():
+                if next_node not in self.parent:
+                    heapq.heappush(heap, (metrics[self.metric], next(counter), dst_node, next_node))
+
+        self.detached -= attached
+        return attached
+
+
 def main():
     # nodes = [1, 2, 3, 4, 5]
     # links = [(1, 2, {'length': 6}), (2, 3, {'length': 8}), (3, 4, {'length': 7}),
@@ -107,6 +288,12 @@ def main():
     set_reverse_links(spanning_tree, link_tree)
     print("With rv. st:", spanning_tree)
 
+    spanning_tree = SpanningTree(links, nodes, root_node=1)
+    spanning_tree.link_up(1, 4, {'port': 4, 'weight': 1})
+    spanning_tree.link_up(4, 1, {'port': 4, 'weight': 1})
+    changed_nodes = spanning_tree.link_down(2, 3, {'port': 2, 'weight': 1})
+    print(f"After 2 -> 3 link down, changed {changed_nodes}:", spanning_tree.spanning_tree)
+
 
 if __name__ == '__main__':
     main()
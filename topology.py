@@ -1,24 +1,47 @@
 import math
+import os
 import time
 import random
-import genetic_algorithm
-import parallel_genetic_algorithm
-import baseline_algorithms
 import python_graph
 import networkx as nx
-from tqdm import tqdm
 from fnss_importer import fnss
 # from matplotlib import pyplot as plt
 
 
+TYPE_TO_WEIGHT_DISTRIBUTION = {'core_aggregation': (1, 10), 'aggregation_edge': (10, 100), 'edge_leaf': (100, 1000)}
+
+
+def build_fat_tree_graph(k: int, rng=random, graph_file: str = None):
+    """ Build fnss fat tree topology with random link weights depending on the link type.
+        Return the topology and the graph made of its edges. With graph_file the graph is loaded from the file
+        if it exists, link weights then live only in the graph, otherwise the new graph is saved to it. """
+    fat_tree_topology = fnss.fat_tree_topology(k)
+    if graph_file is not None and os.path.exists(graph_file):
+        graph = python_graph.Graph.load(graph_file)
+        if graph.num_nodes != fat_tree_topology.number_of_nodes():
+            raise Exception(f'{graph_file} does not hold fat tree graph with k = {k}.')
+        return fat_tree_topology, graph
+    edges = list(fat_tree_topology.edges(data=True))
+    weights = {(src, dst): rng.randint(*TYPE_TO_WEIGHT_DISTRIBUTION[data['type']]) for src, dst, data in edges}
+    nx.set_edge_attributes(fat_tree_topology, values=weights, name='weight')
+    graph = python_graph.Graph(fat_tree_topology.number_of_nodes(), edges, is_directed=False)
+    if graph_file is not None:
+        graph.save(graph_file)
+    return fat_tree_topology, graph
+
+
 def main():
-    fat_tree_topology = fnss.fat_tree_topology(16)
+    # Solvers and progress bars are needed by the comparison only, building the topology does not load them
+    import genetic_algorithm
+    import parallel_genetic_algorithm
+    import island_genetic_algorithm
+    import baseline_algorithms
+    import fat_tree_routing
+    from tqdm import tqdm
+
+    fat_tree_topology, graph = build_fat_tree_graph(16)
     num_nodes = fat_tree_topology.number_of_nodes()
     print(f"{num_nodes=}\n")
-    edges = list(fat_tree_topology.edges(data=True))
-    type_to_weight_distribution = {'core_aggregation': (1, 10), 'aggregation_edge': (10, 100), 'edge_leaf': (100, 1000)}
-    weights = {(src, dst): random.randint(*type_to_weight_distribution[data['type']]) for src, dst, data in edges}
-    nx.set_edge_attributes(fat_tree_topology, values=weights, name='weight')
 
     # num_nodes = 13
     # edges = [(0, 2, 8), (0, 3, 2), (0, 4, 7), (0, 5, 4), (2, 1, 2), (3, 6, 6), (4, 7, 2), (5, 7, 3), (5, 6, 3),
@@ -29,8 +52,6 @@ def main():
     # edges.extend([(n, 99, n) for n in range(1, 99)])
     # python_graph.draw_directed_weighted_graph(edges)
 
-    graph = python_graph.Graph(num_nodes, edges, is_directed=False)
-
     # ------ Algorithms time comparison ------
     
     random.seed(123)
@@ -42,7 +63,7 @@ def main():
     dijkstra_start = time.perf_counter()
     cumulative_path_length = 0
     for i in tqdm(range(experiments), "Dijkstra"):
-        best_path = baseline_algorithms.dijkstra(graph.data, source, destination)
+        best_path = baseline_algorithms.bidirectional_dijkstra(graph, source, destination)
         cumulative_path_length += best_path[1]
     dijkstra_time = time.perf_counter() - dijkstra_start
     print(f"Dijkstra time = {dijkstra_time:.2f} sec, path = {best_path}")
@@ -54,30 +75,75 @@ def main():
     population_size = math.ceil(fat_tree_topology.number_of_nodes() * 0.16)
     cumulative_path_length = 0
     for i in tqdm(range(experiments), "Genetic"):
-        best_path = genetic_algorithm.genetic(graph.data, source, destination, population_size=population_size)
-        cumulative_path_length += genetic_algorithm.fitness(best_path, graph.data)
+        best_path = genetic_algorithm.genetic(graph, source, destination, population_size=population_size)
+        cumulative_path_length += genetic_algorithm.fitness(best_path, graph)
     genetic_time = time.perf_counter() - genetic_start
     print(f"{population_size=}")
     print(f"Genetic time = {genetic_time:.2f} sec,"
-          f" path = {(best_path, genetic_algorithm.fitness(best_path, graph.data))}")
+          f" path = {(best_path, genetic_algorithm.fitness(best_path, graph))}")
     print(f"Average path length = {cumulative_path_length / experiments}")
     print(f"{dijkstra_time/genetic_time:.2f}x improvement of previous\n")
 
     # --------------------------------------
 
+    fat_tree_router = fat_tree_routing.FatTreeRouter(fat_tree_topology)
+    up_down_start = time.perf_counter()
+    cumulative_path_length = 0
+    for i in tqdm(range(experiments), "Fat tree up/down"):
+        best_path = fat_tree_router.shortest_path(source, destination, graph)
+        cumulative_path_length += best_path[1]
+    up_down_time = time.perf_counter() - up_down_start
+    print(f"Fat tree up/down time = {up_down_time:.2f} sec, path = {best_path}")
+    print(f"Average path length = {cumulative_path_length / experiments}")
+    print(f"{dijkstra_time/up_down_time:.2f}x improvement of Dijkstra\n")
+
+    seeded_genetic_start = time.perf_counter()
+    cumulative_path_length = 0
+    for i in tqdm(range(experiments), "Genetic (up/down seeds)"):
+        # the whole initial population comes from up/down paths, no random DFS
+        seed_paths = fat_tree_router.sample(source, destination, population_size)
+        best_path = genetic_algorithm.genetic(
+            graph, source, destination, population_size=population_size, seed_paths=seed_paths, seed_ratio=1.0
+        )
+        cumulative_path_length += genetic_algorithm.fitness(best_path, graph)
+    seeded_genetic_time = time.perf_counter() - seeded_genetic_start
+    print(f"Seeded genetic time = {seeded_genetic_time:.2f} sec,"
+          f" path = {(best_path, genetic_algorithm.fitness(best_path, graph))}")
+    print(f"Average path length = {cumulative_path_length / experiments}")
+    print(f"{genetic_time/seeded_genetic_time:.2f}x improvement of genetic\n")
+
+    # --------------------------------------
+
     parallel_genetic_start = time.perf_counter()
     population_size = math.ceil(fat_tree_topology.number_of_nodes() * 0.16)
     cumulative_path_length = 0
-    parallel_genetic = parallel_genetic_algorithm.ParallelGenetic(graph.data, population_size, cpus=4)
+    parallel_genetic = parallel_genetic_algorithm.ParallelGenetic(graph, population_size, cpus=4, seed=123)
     for i in tqdm(range(experiments), "Genetic (parallel)"):
         best_path = parallel_genetic.genetic(source, destination)
-        cumulative_path_length += genetic_algorithm.fitness(best_path, graph.data)
+        cumulative_path_length += genetic_algorithm.fitness(best_path, graph)
     parallel_genetic_time = time.perf_counter() - parallel_genetic_start
-    print(f"{population_size=}")
+    print(f"{population_size=}, {parallel_genetic_algorithm.is_free_threaded()=}")
     print(f"Parallel genetic time = {parallel_genetic_time:.2f} sec,"
-          f" path = {(best_path, genetic_algorithm.fitness(best_path, graph.data))}")
+          f" path = {(best_path, genetic_algorithm.fitness(best_path, graph))}")
+    print(f"Average path length = {cumulative_path_length / experiments}")
+    print(f"{genetic_time/parallel_genetic_time:.2f}x improvement of previous\n")
+
+    # --------------------------------------
+
+    island_genetic_start = time.perf_counter()
+    population_size = math.ceil(fat_tree_topology.number_of_nodes() * 0.16)
+    cumulative_path_length = 0
+    island_genetic = island_genetic_algorithm.IslandGenetic(graph, population_size, cpus=4, seed=123)
+    for i in tqdm(range(experiments), "Genetic (islands)"):
+        best_path = island_genetic.genetic(source, destination)
+        cumulative_path_length += genetic_algorithm.fitness(best_path, graph)
+    island_genetic.close()
+    island_genetic_time = time.perf_counter() - island_genetic_start
+    print(f"{population_size=}")
+    print(f"Island genetic time = {island_genetic_time:.2f} sec,"
+          f" path = {(best_path, genetic_algorithm.fitness(best_path, graph))}")
     print(f"Average path length = {cumulative_path_length / experiments}")
-    print(f"{genetic_time/parallel_genetic_time:.2f}x improvement of previous")
+    print(f"{genetic_time/island_genetic_time:.2f}x improvement of serial genetic")
 
     # --------------------------------------
 
@@ -92,13 +158,13 @@ def main():
     # random.seed(123)
     # genetic_start = time.perf_counter()
     # for i in range(100):
-    #     best_path = genetic_algorithm.genetic(graph.data, source=0, destination=99)
+    #     best_path = genetic_algorithm.genetic(graph, source=0, destination=99)
     # print(f"Genetic time = {time.perf_counter() - genetic_start:.2f} sec")
-    # print(f'Best path: {best_path}, with length = {genetic_algorithm.fitness(best_path, graph.data)}')
+    # print(f'Best path: {best_path}, with length = {genetic_algorithm.fitness(best_path, graph)}')
     #
     # genetic_start = time.perf_counter()
     # for i in range(100):
-    #     best_path = baseline_algorithms.dijkstra(graph.data, source=0, destination=99)
+    #     best_path = baseline_algorithms.dijkstra(graph, source=0, destination=99)
     # print(f"Dijkstra time = {time.perf_counter() - genetic_start:.2f} sec")
     # print(f'Best path: {best_path[0]}, with length = {best_path[1]}')
 